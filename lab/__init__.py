@@ -2,6 +2,7 @@ from lab.core.backtester import Backtester
 from lab.core.common import plot_data,get_pips,get_range,as_price
 from lab.core.pnl_line import PnlLine, ExitType
 from lab.core.position import Position
+from lab.core.price_cube import PriceCube
 from lab.core.structures import InitError, Direction, TradeInstruction, Ohlc
 from lab.core.transaction import Transaction
 from lab.data import FREDDataProvider, DataProvider, OandaDataProvider
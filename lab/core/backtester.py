@@ -1,3 +1,6 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 
 import numpy as np
@@ -5,9 +8,56 @@ import pandas as pd
 
 from lab.core.position import Position
 from lab.core.common import get_range, BacktestResults
-from lab.core.structures import TradeInstruction, BacktestContext
+from lab.core.price_cube import as_price_cube, PriceCursor
+from lab.core.structures import TradeInstruction, BacktestContext, InstructionBook
 from lab.strategy.strategy import Strategy
 
+# what every worker of a parallel backtest needs, set once per process by the pool initializer
+_pair_context = {}
+
+
+def _init_pair_context(strategy, rates, details, book, commission_per_k, spread_map):
+    _pair_context.update(strategy=strategy, rates=rates, details=details, book=book,
+                         commission_per_k=commission_per_k, spread_map=spread_map)
+
+
+def _run_pair(j, start, stop, capital):
+    c = _pair_context
+    pair_pnl, open_risk, closed, _ = Backtester.simulate_pair(c['strategy'], c['rates'], c['details'], c['book'], j,
+                                                              start, stop, None, capital, c['commission_per_k'],
+                                                              c['spread_map'])
+    return pair_pnl, open_risk, closed
+
+
+def _run_pairs(connection, strategy, rates, details, book, columns, commission_per_k, spread_map):
+    '''
+    Worker of a rebalanced parallel backtest: keeps the positions of its columns between blocks, answers every
+    (start, stop, capital) block with their pnl and open risk and the closed trades once it is sent None
+    '''
+    try:
+        positions = [None] * len(columns)
+        closed = []
+        for start, stop, capital in iter(connection.recv, None):
+            pair_pnl, open_risk = np.zeros((stop - start, len(columns))), np.zeros((stop - start, len(columns)))
+            for n, j in enumerate(columns):
+                pair_pnl[:, n], open_risk[:, n], pair_closed, positions[n] = Backtester.simulate_pair(
+                    strategy, rates, details, book, j, start, stop, positions[n], capital, commission_per_k,
+                    spread_map)
+                closed.extend((i, j, summary) for i, summary in pair_closed)
+            connection.send((pair_pnl, open_risk))
+        connection.send(closed)
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
+
+
+def _receive(connection):
+    result = connection.recv()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
 
 class Backtester:
     def __init__(self, dataprovider, strategy):
@@ -33,67 +83,250 @@ class Backtester:
     def calculate_position(current_holding : Position, today, capital, commission_per_k, currency, todays_candle, spread_map=None):
         spread = Backtester.get_spread(spread_map, currency)
 
-        if not (type(today) is TradeInstruction) and not (current_holding is None):
-            current_holding.pnl_history.append(0)
-            return current_holding
-
         if not (type(today) is TradeInstruction) or np.isnan(today.stop):
+            # nothing to do today, an instruction without a stop included
+            if current_holding is not None:
+                current_holding.pnl_history.skip()
             return current_holding
         today_has_risk = not np.isnan(today.risk) and today.risk != 0
 
-        if current_holding is None and today_has_risk:
-            return Position(today, capital, commission_per_k, spread)
-
-        if current_holding is None and not today_has_risk:
-            return None
-        else:
+        if current_holding is None:
+            return Position(today, capital, commission_per_k, spread) if today_has_risk else None
+        if today_has_risk:
             current_holding.revalue_position(today, todays_candle, capital)
-            return current_holding
+        else:
+            # a riskless instruction only re-checks the stops
+            current_holding.check_stops(todays_candle)
+        return current_holding
 
-    def backtest(self, capital, trade_details_df, rates_df, commission_per_k=0.0, spread_map=None):
-        backtest_results_df = pd.DataFrame(index=trade_details_df.index.values, columns=trade_details_df.columns.values)
-        backtest_results_df = backtest_results_df.where((pd.notnull(backtest_results_df)), None)
-        last_t = trade_details_df.index.values[0]
-        backtest_results_df.set_value(last_t, 'PnL', capital)
+    @staticmethod
+    def calculate_book_position(current_holding : Position, book, event, i, j, capital, commission_per_k, currency,
+                                todays_candle, spread_map=None):
+        '''
+        calculate_position for the i-th date of an InstructionBook, event is the position of the currency's
+        instruction that date or None
+        '''
+        if event is not None:
+            return Backtester.calculate_position(current_holding, book.instruction(event), capital, commission_per_k,
+                                                 currency, todays_candle, spread_map)
+        if current_holding is not None:
+            if book.is_checkable(i, j):
+                current_holding.check_stops(todays_candle)
+            else:
+                current_holding.pnl_history.skip()
+        return current_holding
+
+    def backtest(self, capital, trade_details_df, rates_df, commission_per_k=0.0, spread_map=None, rebalance=1):
+        '''
+        Runs the trade details over the rates, either an InstructionBook on the rates' dates or a dates x
+        currencies frame with a TradeInstruction where there is something to do. Returns a frame of each
+        currency's daily pnl with the running equity in 'PnL', and the summary pnl of every position that
+        was closed out. Open risk at the end of every bar is kept in self.open_risk.
+        Trades are sized on the equity at the start of every block of `rebalance` bars, the previous bar's
+        by default, or on the initial capital throughout when rebalance is None.
+        '''
+        rates = as_price_cube(rates_df)
+        cursor = PriceCursor(rates)
+        book = trade_details_df if isinstance(trade_details_df, InstructionBook) else None
+        currencies = list(trade_details_df.columns.values)
+        if book is None:
+            details = trade_details_df.reindex(index=rates.index, columns=currencies).values
+        elif not book.index.equals(rates.index):
+            raise LookupError('Instruction book dates do not match the rates')
+        rows = len(rates.index)
+
+        equity = np.full(rows, float(capital))
+        pair_pnl = np.zeros((rows, len(currencies)))
+        open_risk = np.zeros((rows, len(currencies)))
+        positions = [None] * len(currencies)
         pnl_breakdown = []
-        for t in rates_df.index.values[1:]:
-            current_capital = backtest_results_df.ix[last_t, 'PnL']
-            for currency in trade_details_df.columns.values:
-                todays_candle = rates_df.ix[t, currency]
-                todays_details = trade_details_df.ix[t, currency]
-                current_position = backtest_results_df.ix[last_t, currency]
-
-                # DEBUG
-                if type(todays_details) is TradeInstruction:
-                    1 + 1
-
-                self.strategy.schedule([current_position], rates_df[currency][:t])
-
-                current_position = Backtester.calculate_position(current_position, todays_details, capital,
-                                                                 commission_per_k, currency, todays_candle, spread_map)
+        block = rows if rebalance is None else max(int(rebalance), 1)
+        sizing_capital = capital
+        for i in range(1, rows):
+            cursor.move_to(i)
+            if (i - 1) % block == 0:
+                sizing_capital = capital
+            current_capital = capital
+            todays_events = None if book is None else dict((book.col[k], k) for k in book.events(i))
+            for j, currency in enumerate(currencies):
+                data_ser = cursor[currency]
+                self.strategy.schedule([positions[j]], data_ser)
+
+                if book is None:
+                    current_position = Backtester.calculate_position(positions[j], details[i, j], sizing_capital,
+                                                                     commission_per_k, currency, data_ser[-1],
+                                                                     spread_map)
+                else:
+                    current_position = Backtester.calculate_book_position(positions[j], book, todays_events.get(j),
+                                                                          i, j, sizing_capital, commission_per_k,
+                                                                          currency, data_ser[-1], spread_map)
 
                 if current_position is not None:
                     todays_profit = current_position.pnl_history[-1]
-
-                    # DEBUG
-                    if abs(todays_profit) > 0:
-                        1 + 1
-
+                    pair_pnl[i, j] = todays_profit
                     current_capital += todays_profit
-                    if abs(sum([x.risk for x in current_position.lines])) == 0:
+                    net_risk = current_position.net_risk
+                    if abs(net_risk) == 0:
                         pnl_breakdown.append(current_position.summary_pnl)
                         current_position = None
+                    else:
+                        open_risk[i, j] = net_risk
 
-                backtest_results_df.set_value(t, currency, current_position)
+                positions[j] = current_position
 
-            backtest_results_df.set_value(t, 'PnL', current_capital)
+            equity[i] = current_capital
             capital = current_capital
-            last_t = t
+
+        self.open_risk = pd.DataFrame(open_risk, index=rates.index, columns=currencies)
+        backtest_results_df = pd.DataFrame(pair_pnl, index=rates.index, columns=currencies)
+        backtest_results_df['PnL'] = equity
         return (backtest_results_df, pnl_breakdown)
 
+    @staticmethod
+    def simulate_pair(strategy, rates, details, book, j, start, stop, position, capital, commission_per_k=0.0,
+                      spread_map=None):
+        '''
+        Runs one currency over the rows start..stop, sizing every trade on capital, from the given position
+        (None when flat). Returns that currency's pnl and open risk on those rows, the (row, summary pnl) of
+        the positions closed out and the position left open.
+        '''
+        cursor = PriceCursor(rates)
+        currency = rates.columns[j]
+        pair_pnl = np.zeros(stop - start)
+        open_risk = np.zeros(stop - start)
+        closed = []
+        for i in range(start, stop):
+            cursor.move_to(i)
+            data_ser = cursor[currency]
+            strategy.schedule([position], data_ser)
+
+            if book is None:
+                position = Backtester.calculate_position(position, details[i, j], capital, commission_per_k,
+                                                         currency, data_ser[-1], spread_map)
+            else:
+                todays_events = dict((book.col[k], k) for k in book.events(i))
+                position = Backtester.calculate_book_position(position, book, todays_events.get(j), i, j, capital,
+                                                              commission_per_k, currency, data_ser[-1], spread_map)
+
+            if position is not None:
+                pair_pnl[i - start] = position.pnl_history[-1]
+                net_risk = position.net_risk
+                if abs(net_risk) == 0:
+                    closed.append((i, position.summary_pnl))
+                    position = None
+                else:
+                    open_risk[i - start] = net_risk
+        return pair_pnl, open_risk, closed, position
+
+    def parallel_backtest(self, capital, trade_details_df, rates_df, commission_per_k=0.0, spread_map=None,
+                          rebalance=None, max_workers=None):
+        '''
+        Same as backtest(..., rebalance) with the currencies simulated in worker processes. The pairs only
+        interact through the capital trades are sized on, the equity at the start of every block of
+        `rebalance` bars or the initial capital throughout when rebalance is None. The pair pnls are added up
+        into the equity in the same order backtest adds them, so the results are identical.
+        With fixed capital every currency is one task over the whole history. When rebalancing, each worker
+        keeps the positions of its currencies and every block is a round trip to all the workers that
+        returns the block's pnl and open risk, so this only pays off with coarse rebalancing (tens of bars
+        or more): rebalanced every bar the workers mostly wait on each other.
+        The strategy is pickled into the workers, so schedule() must not rely on state shared across pairs.
+        '''
+        rates = as_price_cube(rates_df)
+        book = trade_details_df if isinstance(trade_details_df, InstructionBook) else None
+        currencies = list(trade_details_df.columns.values)
+        details = None
+        if book is None:
+            details = trade_details_df.reindex(index=rates.index, columns=currencies).values
+        elif not book.index.equals(rates.index):
+            raise LookupError('Instruction book dates do not match the rates')
+        rates = rates.take(columns=currencies)
+        rows, cols = len(rates.index), len(currencies)
+
+        equity = np.full(rows, float(capital))
+        pair_pnl = np.zeros((rows, cols))
+        open_risk = np.zeros((rows, cols))
+        block = rows if rebalance is None else max(int(rebalance), 1)
+        starts = list(range(1, rows, block))
+        if len(starts) <= 1:
+            closed = self._parallel_fixed_capital(capital, rates, details, book, commission_per_k, spread_map,
+                                                  max_workers, pair_pnl, open_risk)
+            Backtester._accumulate_equity(equity, pair_pnl, 1, rows)
+        else:
+            closed = self._parallel_rebalanced(starts, block, equity, rates, details, book, commission_per_k,
+                                               spread_map, max_workers, pair_pnl, open_risk)
+
+        self.open_risk = pd.DataFrame(open_risk, index=rates.index, columns=currencies)
+        backtest_results_df = pd.DataFrame(pair_pnl, index=rates.index, columns=currencies)
+        backtest_results_df['PnL'] = equity
+        return (backtest_results_df, [summary for i, j, summary in sorted(closed, key=lambda c: c[:2])])
+
+    @staticmethod
+    def _accumulate_equity(equity, pair_pnl, start, stop):
+        # running sum over the bars' pnls in currency order, as backtest accumulates them
+        if start < stop:
+            steps = np.concatenate([[equity[start - 1]], pair_pnl[start:stop].ravel()])
+            equity[start:stop] = np.cumsum(steps)[pair_pnl.shape[1]::pair_pnl.shape[1]]
+
+    def _parallel_fixed_capital(self, capital, rates, details, book, commission_per_k, spread_map, max_workers,
+                                pair_pnl, open_risk):
+        rows, cols = pair_pnl.shape
+        closed = []
+        if rows < 2:
+            return closed
+        with ProcessPoolExecutor(max_workers, initializer=_init_pair_context,
+                                 initargs=(self.strategy, rates, details, book, commission_per_k, spread_map)) as pool:
+            runs = [pool.submit(_run_pair, j, 1, rows, capital) for j in range(cols)]
+            for j, run in enumerate(runs):
+                pair_pnl[1:, j], open_risk[1:, j], pair_closed = run.result()
+                closed.extend((i, j, summary) for i, summary in pair_closed)
+        return closed
+
+    def _parallel_rebalanced(self, starts, block, equity, rates, details, book, commission_per_k, spread_map,
+                             max_workers, pair_pnl, open_risk):
+        rows, cols = pair_pnl.shape
+        workers = max(1, min(max_workers or os.cpu_count() or 1, cols))
+        groups = [list(range(w, cols, workers)) for w in range(workers)]
+        connections, processes = [], []
+        try:
+            for columns in groups:
+                connection, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_run_pairs, args=(
+                    child, self.strategy, rates, details, book, columns, commission_per_k, spread_map), daemon=True)
+                process.start()
+                child.close()
+                connections.append(connection)
+                processes.append(process)
+
+            for start in starts:
+                stop = min(start + block, rows)
+                capital = equity[start - 1]
+                for connection in connections:
+                    connection.send((start, stop, capital))
+                for connection, columns in zip(connections, groups):
+                    pair_pnl[start:stop, columns], open_risk[start:stop, columns] = _receive(connection)
+                Backtester._accumulate_equity(equity, pair_pnl, start, stop)
+
+            closed = []
+            for connection in connections:
+                connection.send(None)
+                closed.extend(_receive(connection))
+            return closed
+        finally:
+            for connection in connections:
+                connection.close()
+            for process in processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+
     def full_backtest(self, capital, commission_per_k=0.0, date_range=None, use_spread=True):
-        rates = self.dataprovider.get_rates() if date_range is None else get_range(self.dataprovider.get_rates(),
-                                                                                   date_range[0], date_range[1])
+        rates = self.dataprovider.get_price_cube()
+        if date_range is not None:
+            rates = get_range(rates, date_range[0], date_range[1])
+        return self.backtest_rates(capital, rates, commission_per_k, use_spread)
+
+    def backtest_rates(self, capital, rates, commission_per_k=0.0, use_spread=True):
+        '''Runs the strategy over rates already loaded and backtests its trade details on them'''
         trade_details = self.strategy.run(rates)
 
         spread_map = Backtester.spread_map() if use_spread else None
@@ -102,25 +335,31 @@ class Backtester:
 
 
 class Backtester2:
-    def __init__(self, strategy: Strategy):
+    def __init__(self, strategy: Strategy, lookback=None):
         self.strategy = strategy
         self.position_pnls = []
+        self.lookback = lookback
 
     def backtest(self, capital, price_data : pd.DataFrame, commission_per_k=0.0) :
-        self.context = BacktestContext(capital, price_data.columns.values)
-        self.context.pnl = pd.Series(capital,index=price_data.index.values)
+        price_data = as_price_cube(price_data)
+        currencies = price_data.columns.values
+        self.context = BacktestContext(capital, currencies, price_data.index)
         self.context.commission_per_k = commission_per_k
-        backtest_results = BacktestResults()
 
         if len(price_data.index) < 2 :
-            return backtest_results
-
-        t_slice = price_data.index.values[0]
-        for index, row in price_data.iloc[1:,:].iterrows():
-            capital = self.context.pnl[t_slice]
-            for currency in price_data.columns.values:
+            return BacktestResults()
+
+        backtest_results = BacktestResults(price_data.index, currencies, capital)
+        attribution = backtest_results.attribution_values
+        nominal_attribution = self.context.nominal_attribution_values
+        pnl = self.context.pnl_values
+        cursor = PriceCursor(price_data, self.lookback)
+        for i, index in enumerate(price_data.index[1:], 1):
+            cursor.move_to(i)
+            capital = pnl[i - 1]
+            for j, currency in enumerate(currencies):
                 nom_returns = 0
-                data_ser = price_data.ix[:index,currency]
+                data_ser = cursor[currency]
                 positions :List[Position] = self.context.positions[currency]
                 instruction = self.strategy.schedule(positions, data_ser,self.context)
 
@@ -128,19 +367,16 @@ class Backtester2:
                     if positions == []:
                         positions.append(Position(instruction, self.context.capital,commission_per_k))
                     else:
-                        positions[-1].revalue_position(instruction,price_data.loc[index,currency],capital)
+                        positions[-1].revalue_position(instruction,data_ser[-1],capital)
                     nom_returns = sum([p.pnl_history[-1] for p in positions])
 
-                if positions and positions[-1].returns.__contains__(index):
-                    backtest_results.attribution.loc[index, currency] = positions[-1].returns[index]
-                else:
-                    backtest_results.attribution.loc[index, currency] = 0
+                if positions and index in positions[-1].returns:
+                    attribution[i, j] = positions[-1].returns[index]
 
-                self.context.nominal_attribution.loc[index, currency] = nom_returns
+                nominal_attribution[i, j] = nom_returns
                 capital = capital+nom_returns
-                self.context.pnl.loc[index] = capital
-            t_slice = index
-        backtest_results.pnl = self.context.pnl
-        backtest_results.nominal_attribution = self.context.nominal_attribution
+                pnl[i] = capital
+        backtest_results.pnl_values = pnl
+        backtest_results.nominal_attribution_values = nominal_attribution
 
-        return backtest_results
\ No newline at end of file
+        return backtest_results
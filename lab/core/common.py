@@ -1,8 +1,10 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import quandl as qdl
 
-from lab.core.structures import TradeInstruction
+from lab.core.price_cube import PriceCube
+from lab.core.structures import InstructionBook
 
 
 def get_currency_dataframe(cur):
@@ -33,6 +35,8 @@ def plot_data(df, title="closing prices", normalize=False):
 
 def get_range(df, start, end):
     dates = pd.date_range(start, end)
+    if isinstance(df, PriceCube):
+        return df.take(df.index.isin(dates))
     indexFrame = pd.DataFrame(index=dates)
     jointFrame = indexFrame.join(df, how='inner')
     return jointFrame
@@ -63,19 +67,32 @@ def as_price(value, currency=None):
         return value / 10000
 
 
-def price_data_to_trade_lines(price_df, rolling_risk_df, stop_df, pips_df):
-    trade_details_df = pd.DataFrame(index=price_df.index.values, columns=price_df.columns.values)
-    for i in trade_details_df.index.values:
-        for c in trade_details_df.columns.values:
-            td = TradeInstruction(price=price_df.ix[i, c], stop=stop_df.ix[i, c], risk=rolling_risk_df.ix[i, c], currency=c,
-                                  trade_date=i)
-            trade_details_df.set_value(i, c, td)
-    return trade_details_df
+def price_data_to_trade_lines(price_df, rolling_risk_df, stop_df, pips_df=None):
+    '''Instructions to trade at price_df with the given risk and stop, only the actionable cells are kept'''
+    return InstructionBook.from_frames(price_df, rolling_risk_df, stop_df)
 
 
 class BacktestResults:
-    def __init__(self):
-        self.nominal_attribution: pd.DataFrame = pd.DataFrame()
-        self.attribution: pd.DataFrame = pd.DataFrame()
-        self.pnl = pd.DataFrame()
-        self.headlinePnL = 0
\ No newline at end of file
+    '''
+    Results over a price index and its currencies. The buffers are sized up front and filled by position,
+    the attribution frames cover every bar after the first one.
+    '''
+    def __init__(self, index=None, columns=None, capital=0.0):
+        self.index = pd.Index([] if index is None else index)
+        self.columns = [] if columns is None else list(columns)
+        self.attribution_values = np.zeros((len(self.index), len(self.columns)))
+        self.nominal_attribution_values = np.zeros((len(self.index), len(self.columns)))
+        self.pnl_values = np.full(len(self.index), float(capital))
+        self.headlinePnL = 0
+
+    @property
+    def attribution(self) -> pd.DataFrame:
+        return pd.DataFrame(self.attribution_values[1:], index=self.index[1:], columns=self.columns)
+
+    @property
+    def nominal_attribution(self) -> pd.DataFrame:
+        return pd.DataFrame(self.nominal_attribution_values[1:], index=self.index[1:], columns=self.columns)
+
+    @property
+    def pnl(self) -> pd.Series:
+        return pd.Series(self.pnl_values, index=self.index)
\ No newline at end of file
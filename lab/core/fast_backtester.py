@@ -0,0 +1,122 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from lab.core.backtester import Backtester
+from lab.core.common import as_price
+from lab.core.price_cube import as_price_cube
+from lab.core.stops import first_breach_in_runs
+from lab.core.structures import Direction, InstructionBook
+
+
+class FastBacktester(Backtester):
+    '''
+    Replays a strategy's whole instruction grid, or book, visiting only the bars where something can happen:
+    the dates of instructions with risk and, while a position is open, the first date on which one of its
+    stops is re-checked and breached. Those are searched for ahead over the price arrays rather than bar by
+    bar. Positions are the same Position objects Backtester builds and trades with calculate_position, so
+    fills, sizing, stops and lot netting cannot drift between the two engines and the results match.
+    This only pays off on sparse books: the bars with events are still replayed one by one and the stop search
+    ahead costs more than it saves when there is an instruction on most bars, so a strategy trading most pairs
+    on most bars (StrengthMomentum) runs slower here than in Backtester. Strategies whose schedule() can move the
+    stops of open positions on any bar (strategy.schedules, LineReg_Tf) and sizing on anything but the
+    previous bar's equity are handed to Backtester.backtest.
+    '''
+
+    def backtest(self, capital, trade_details_df, rates_df, commission_per_k=0.0, spread_map=None, rebalance=1):
+        if self.strategy.schedules or rebalance != 1:
+            return Backtester.backtest(self, capital, trade_details_df, rates_df, commission_per_k, spread_map,
+                                       rebalance)
+        rates = as_price_cube(rates_df)
+        currencies = list(trade_details_df.columns.values)
+        book = trade_details_df
+        if not isinstance(book, InstructionBook):
+            book = InstructionBook.from_trade_details(trade_details_df.reindex(index=rates.index, columns=currencies))
+        return self.backtest_book(capital, book, rates.take(columns=currencies), commission_per_k, spread_map)
+
+    def backtest_book(self, capital, book, rates, commission_per_k=0.0, spread_map=None):
+        '''Same as backtest for an InstructionBook over rates holding the book's currencies in its order'''
+        if self.strategy.schedules:
+            return Backtester.backtest(self, capital, book, rates, commission_per_k, spread_map)
+        if not book.index.equals(rates.index):
+            raise LookupError('Instruction book dates do not match the rates')
+        rows, cols = len(rates.index), len(book.columns)
+        currencies = list(book.columns)
+        spreads = [as_price(Backtester.get_spread(spread_map, c), c) for c in currencies]
+        checks = [book.checks(j) for j in range(cols)]
+
+        def next_breach(j, position, start, known):
+            # lots keep their stops, so a breach found earlier still stands until it is reached
+            breaches = {}
+            for line in position.lines:
+                if line not in known or known[line] is not None and known[line] < start:
+                    details = line.trade_details
+                    known[line] = first_breach_in_runs(rates.high[:, j], rates.low[:, j], details.stop,
+                                                       line.direction is Direction.Long, *checks[j], start,
+                                                       spreads[j], details.stop_type)
+                breaches[line] = known[line]
+            known.clear()
+            known.update(breaches)
+            hits = [b for b in breaches.values() if b is not None]
+            return min(hits) if hits else None
+
+        pair_pnl = np.zeros((rows, cols))
+        equity = np.full(rows, np.nan)
+        open_risk = np.full((rows, cols), np.nan)
+        if rows:
+            equity[0] = capital
+            open_risk[0] = 0.0
+
+        positions = [None] * cols
+        known_breaches = [{} for _ in range(cols)]
+        # (row, pair) of the next breach of every open position, stale once pending moves on
+        stop_events, pending = [], [None] * cols
+        event_rows = [i for i in np.flatnonzero(np.diff(book.offsets)) if i >= 1]
+        next_row = 0
+        pnl_breakdown = []
+        while next_row < len(event_rows) or stop_events:
+            i = min(event_rows[next_row] if next_row < len(event_rows) else rows,
+                    stop_events[0][0] if stop_events else rows)
+            todays_events = {}
+            if next_row < len(event_rows) and event_rows[next_row] == i:
+                todays_events = dict((book.col[k], k) for k in book.events(i))
+                next_row += 1
+            while stop_events and stop_events[0][0] == i:
+                _, j = heapq.heappop(stop_events)
+                if pending[j] == i:
+                    todays_events.setdefault(j, None)
+            if not todays_events:
+                continue
+
+            current_capital = capital
+            for j in sorted(todays_events):
+                candle = rates.ohlc(i, j)
+                current_position = Backtester.calculate_book_position(positions[j], book, todays_events[j], i, j,
+                                                                      capital, commission_per_k, currencies[j],
+                                                                      candle, spread_map)
+                pending[j] = None
+                if current_position is not None:
+                    todays_profit = current_position.pnl_history[-1]
+                    pair_pnl[i, j] = todays_profit
+                    current_capital += todays_profit
+                    net_risk = current_position.net_risk
+                    if abs(net_risk) == 0:
+                        pnl_breakdown.append(current_position.summary_pnl)
+                        current_position = None
+                        open_risk[i, j] = 0.0
+                        known_breaches[j].clear()
+                    else:
+                        open_risk[i, j] = net_risk
+                        pending[j] = next_breach(j, current_position, i + 1, known_breaches[j])
+                        if pending[j] is not None:
+                            heapq.heappush(stop_events, (pending[j], j))
+                positions[j] = current_position
+
+            equity[i] = current_capital
+            capital = current_capital
+
+        self.open_risk = pd.DataFrame(open_risk, index=rates.index, columns=currencies).ffill()
+        backtest_results_df = pd.DataFrame(pair_pnl, index=rates.index, columns=currencies)
+        backtest_results_df['PnL'] = pd.Series(equity, index=rates.index).ffill().values
+        return (backtest_results_df, pnl_breakdown)
@@ -0,0 +1,84 @@
+from collections import deque
+
+import numpy as np
+
+
+class LotBook:
+    '''
+    Open lots of a position, oldest first. Lots are netted off the front of the queue, the net risk and
+    direction are kept up to date as lots are added and closed so reading them does not walk the book.
+    Lots are Transactions or anything with risk, direction and close_transaction(price, risk_to_close, date).
+    '''
+    def __init__(self):
+        self.lots = deque()
+        self.net_risk = 0
+        self.direction = None
+
+    def __len__(self):
+        return len(self.lots)
+
+    def __iter__(self):
+        return iter(self.lots)
+
+    def __getitem__(self, k):
+        return self.lots[k]
+
+    def __repr__(self):
+        return 'LotBook(%s)' % list(self.lots)
+
+    def append(self, lot):
+        self.lots.append(lot)
+        self.net_risk += lot.risk
+        self.direction = lot.direction
+
+    def close_front(self, price, residual_risk, date=None):
+        '''
+        Closes the oldest lot against residual_risk (of the opposite sign), all of it if the residual is bigger.
+        Returns (pnl, residual risk left, the lot if it is now closed else None).
+        '''
+        lot = self.lots[0]
+        if abs(residual_risk) > abs(lot.risk):
+            residual_risk += lot.risk
+            self.net_risk -= lot.risk
+            pnl = lot.close_transaction(price, date=date)
+        else:
+            pnl = lot.close_transaction(price, residual_risk, date)
+            self.net_risk += residual_risk
+            residual_risk = 0
+            if lot.risk != 0:
+                return pnl, residual_risk, None
+
+        self.lots.popleft()
+        self.emptied()
+        return pnl, residual_risk, lot
+
+    def close_where(self, exit_price, date=None):
+        '''
+        Closes every lot exit_price(lot) gives a price for (None keeps it open) at that price.
+        Returns (pnl, closed lots in book order).
+        '''
+        pnl, closed, kept = 0, [], deque()
+        for lot in self.lots:
+            price = exit_price(lot)
+            if price is None:
+                kept.append(lot)
+                continue
+            self.net_risk -= lot.risk
+            pnl += lot.close_transaction(price, np.nan, date)
+            closed.append(lot)
+        if closed:
+            self.lots = kept
+            self.emptied()
+        return pnl, closed
+
+    def remove(self, lot):
+        '''Drops a lot from anywhere in the book'''
+        self.lots.remove(lot)
+        self.net_risk = sum([l.risk for l in self.lots])
+        self.emptied()
+
+    def emptied(self):
+        # an empty book holds exactly no risk, whatever rounding the running total picked up
+        if not self.lots:
+            self.net_risk = 0
+            self.direction = None
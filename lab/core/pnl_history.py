@@ -0,0 +1,61 @@
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+
+class PnlHistory:
+    '''
+    Pnl booked entry by entry, stored sparsely: only non zero amounts are kept as (date, amount) events,
+    with the entry number they were booked at and a running total. It reads like the dense list it replaces,
+    len(), [k], [-1], iteration and sum() all see a zero for every entry that booked nothing.
+    '''
+    __slots__ = ('length', 'positions', 'dates', 'amounts', 'total')
+
+    def __init__(self):
+        self.length = 0
+        self.positions = []
+        self.dates = []
+        self.amounts = []
+        self.total = 0
+
+    def append(self, amount, date=None):
+        if amount != 0:
+            self.positions.append(self.length)
+            self.dates.append(date)
+            self.amounts.append(amount)
+        self.total += amount
+        self.length += 1
+
+    def skip(self):
+        '''An entry that booked nothing'''
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.length
+        if not 0 <= k < self.length:
+            raise IndexError('pnl history index out of range')
+        if self.positions and self.positions[-1] == k:
+            return self.amounts[-1]
+        e = bisect_left(self.positions, k)
+        return self.amounts[e] if e < len(self.positions) and self.positions[e] == k else 0
+
+    def __iter__(self):
+        return iter(self.dense())
+
+    def __repr__(self):
+        return 'PnlHistory(%s entries, %s)' % (self.length, list(zip(self.dates, self.amounts)))
+
+    def dense(self):
+        '''Every entry, zeros included, as an array'''
+        values = np.zeros(self.length)
+        values[self.positions] = self.amounts
+        return values
+
+    def to_series(self):
+        '''The non zero amounts by date'''
+        return pd.Series(self.amounts, index=self.dates, dtype=np.float64)
@@ -1,5 +1,7 @@
+import itertools
 import time
 import numpy as np
+import pandas as pd
 from lab.core.structures import TradeInstruction
 from enum import Enum
 
@@ -11,6 +13,9 @@ class ExitType(Enum):
 
 
 class PnlLine:
+    __slots__ = ('__openingtrade__', '__details__', 'to_date', 'from_date', 'currency', 'initial_capital', 'open_price',
+                 'close_price', 'exit_type', 'returns', '__pnl__')
+
     def __init__(self, opening_trade, initial_capital=np.NaN, to_date=None, close_price=np.NaN, pnl=0, details=[]):
         self.__openingtrade__ = opening_trade
         self.details = [opening_trade] if not details else details
@@ -30,6 +35,17 @@ class PnlLine:
     def pnl(self):
         return self.__pnl__
 
+    @property
+    def details(self):
+        # sum() keeps the details lists of the lines it adds up, they are flattened here the first time they are read
+        if type(self.__details__) is tuple:
+            self.__details__ = list(itertools.chain.from_iterable(self.__details__))
+        return self.__details__
+
+    @details.setter
+    def details(self, value):
+        self.__details__ = value
+
     @pnl.setter
     def pnl(self, value):
         self.__pnl__ = value
@@ -59,11 +75,57 @@ class PnlLine:
 
     @staticmethod
     def sum(lines):
-
+        '''
+        Same as adding the lines up left to right, in one pass: the running fields are compared exactly as
+        __add__ compares them. The details are not copied, the sum holds on to the lines' lists and reads
+        them as one list on demand.
+        '''
         if not lines:
             return None
+        if len(lines) == 1:
+            return lines[0]
 
-        acca = lines[0]
+        first = lines[0]
+        from_date, to_date, open_price = first.from_date, first.to_date, first.open_price
+        initial_cap, close_price = first.initial_capital, first.close_price
+        pnl, exit_type = first.pnl, first.exit_type
+        parts = list(PnlLine._detail_parts(first))
         for l in lines[1:]:
-            acca = acca + l
-        return acca
+            if first.currency != l.currency:
+                raise LookupError("Currencies do not match")
+            open_price = open_price if from_date < l.from_date else l.open_price
+            initial_cap = initial_cap if from_date < l.to_date and not np.isnan(initial_cap) else l.initial_capital
+            from_date = from_date if from_date < l.to_date else l.from_date
+            close_price = close_price if to_date > l.to_date else l.close_price
+            to_date = to_date if to_date > l.to_date else l.to_date
+            pnl = pnl + l.pnl
+            exit_type = ExitType.Multi if exit_type is not l.exit_type else exit_type
+            parts.extend(PnlLine._detail_parts(l))
+
+        pnl_line = PnlLine(first.__openingtrade__, pnl=pnl, to_date=to_date, close_price=close_price,
+                           initial_capital=initial_cap, details=tuple(parts))
+        pnl_line.from_date = from_date
+        pnl_line.open_price = open_price
+        pnl_line.exit_type = exit_type
+        return pnl_line
+
+    @staticmethod
+    def _detail_parts(line):
+        details = line.__details__
+        return details if type(details) is tuple else (details,)
+
+    @staticmethod
+    def to_frame(lines):
+        '''One row per line, e.g. a position's transaction_pnls or a backtest's pnl breakdown, Nones skipped'''
+        lines = [l for l in lines if l is not None]
+        return pd.DataFrame({'currency': [l.currency for l in lines],
+                             'from_date': [l.from_date for l in lines],
+                             'to_date': [l.to_date for l in lines],
+                             'open_price': np.array([l.open_price for l in lines], dtype=np.float64),
+                             'close_price': np.array([l.close_price for l in lines], dtype=np.float64),
+                             'initial_capital': np.array([l.initial_capital for l in lines], dtype=np.float64),
+                             'pnl': np.array([l.pnl for l in lines], dtype=np.float64),
+                             'returns': np.array([l.returns for l in lines], dtype=np.float64),
+                             'exit_type': [l.exit_type.name for l in lines]},
+                            columns=['currency', 'from_date', 'to_date', 'open_price', 'close_price',
+                                     'initial_capital', 'pnl', 'returns', 'exit_type'])
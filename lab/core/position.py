@@ -1,5 +1,7 @@
 from lab.core.structures import Direction, StopType
 from lab.core.transaction import Transaction
+from lab.core.lot_book import LotBook
+from lab.core.pnl_history import PnlHistory
 from lab.core.pnl_line import PnlLine
 from lab.core.common import as_price
 import math
@@ -11,10 +13,12 @@ class Position:
             raise LookupError('cannot initiate holding with no risk')
 
         trsction = Transaction(initiating_line, capital, commission_per_k=commission_per_k, spread=spread)
-        self.lines = [trsction]
+        self.lines = LotBook()
+        self.lines.append(trsction)
         self.commission_per_k = commission_per_k
         self.spread = spread
-        self.pnl_history = [trsction.pnl]
+        self.pnl_history = PnlHistory()
+        self.pnl_history.append(trsction.pnl, initiating_line.trade_date)
         self.transaction_pnls = []
         self.price_history = [initiating_line.price]
         self.returns = {}
@@ -22,29 +26,36 @@ class Position:
 
     @property
     def net_direction(self):
-        return None if not self.lines else self.lines[-1].direction
+        return self.lines.direction
 
     @property
     def net_risk(self):
-        return 0 if not self.lines else sum([l.risk for l in self.lines])
+        return self.lines.net_risk
 
     @property
     def summary_pnl(self):
         return PnlLine.sum([x for x in self.transaction_pnls])
 
     def close_stop_outs(self, candle):
-        running_pnl = 0
-        for line in self.lines:
+        def stop_price(line):
             if line.trade_details.stop_type is StopType.Soft:
-                continue
+                return None
             spread_price = as_price(line.spread, line.trade_details.currency)
             short_stopped_out = line.direction is Direction.Short and candle.high + spread_price >= line.trade_details.stop
             long_stopped_out = line.direction is Direction.Long and candle.low - spread_price <= line.trade_details.stop
-            if short_stopped_out or long_stopped_out:
-                running_pnl += line.close_transaction(line.trade_details.stop, date=candle.date) #maybe we should use spread + price here
-                self.close_transaction(line)
+            #maybe we should use spread + price here
+            return line.trade_details.stop if short_stopped_out or long_stopped_out else None
+
+        running_pnl, closed = self.lines.close_where(stop_price, candle.date)
+        self.transaction_pnls.extend([line.summary_pnl for line in closed])
         return running_pnl
 
+    def check_stops(self, candle):
+        '''Stops out the lines the candle breaches, booking what they lock in as the entry of the day'''
+        locked_in_pnl = self.close_stop_outs(candle)
+        self.pnl_history.append(locked_in_pnl, candle.date)
+        return locked_in_pnl
+
     def revalue_position(self, trade_line, current_candle, current_capital):
 
         if trade_line.currency != self.currency:
@@ -69,19 +80,14 @@ class Position:
                     self.lines.append(pnl_line)
                     residual_risk = 0
                 else:
-                    for line in self.lines:
-                        # fully close out the trade else partially close out
-                        if abs(residual_risk) > abs(line.risk):
-                            residual_risk += line.risk
-                            locked_in_pnl += line.close_transaction(price=trade_line.price,date=trade_line.trade_date)
-                            self.close_transaction(line)
-                        else:
-                            locked_in_pnl += line.close_transaction(trade_line.price, residual_risk, trade_line.trade_date)
-                            if line.risk == 0:
-                                self.close_transaction(line)
-                            residual_risk = 0
-
-        self.pnl_history.append(locked_in_pnl)
+                    # net off the oldest lots first
+                    pnl, residual_risk, closed = self.lines.close_front(trade_line.price, residual_risk,
+                                                                        trade_line.trade_date)
+                    locked_in_pnl += pnl
+                    if closed is not None:
+                        self.transaction_pnls.append(closed.summary_pnl)
+
+        self.pnl_history.append(locked_in_pnl, trade_line.trade_date)
 
         return locked_in_pnl
 
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from lab.core.structures import Ohlc
+
+
+class PriceCube:
+    '''
+    Columnar price store: one float64 (bars x pairs) array per ohlc field on a shared index.
+    Ohlc objects are only created on demand through the adapter methods (ohlc, ohlc_series, to_ohlc_frame).
+    '''
+    fields = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, index, columns, open, high, low, close, volume=None):
+        self.index = pd.Index(index)
+        self.columns = pd.Index(columns)
+        shape = (len(self.index), len(self.columns))
+        self.open = self._as_field_array(open, shape)
+        self.high = self._as_field_array(high, shape)
+        self.low = self._as_field_array(low, shape)
+        self.close = self._as_field_array(close, shape)
+        self.volume = np.zeros(shape) if volume is None else self._as_field_array(volume, shape)
+
+    @staticmethod
+    def _as_field_array(values, shape):
+        return np.asarray(values, dtype=np.float64).reshape(shape)
+
+    @property
+    def shape(self):
+        return self.open.shape
+
+    @property
+    def empty(self):
+        return self.open.size == 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, currency):
+        return self.ohlc_series(currency)
+
+    def __repr__(self):
+        return "PriceCube(bars=%s, pairs=%s)" % (len(self.index), list(self.columns.values))
+
+    def field(self, name):
+        return pd.DataFrame(getattr(self, name), index=self.index, columns=self.columns, copy=False)
+
+    def pair(self, currency):
+        j = self.columns.get_loc(currency)
+        return pd.DataFrame(dict((f, getattr(self, f)[:, j]) for f in self.fields), index=self.index,
+                            columns=list(self.fields))
+
+    def ohlc(self, i, j):
+        return Ohlc(self.open[i, j], self.high[i, j], self.low[i, j], self.close[i, j], self.index[i],
+                    self.volume[i, j])
+
+    def ohlc_series(self, currency):
+        j = self.columns.get_loc(currency)
+        return pd.Series([self.ohlc(i, j) for i in range(len(self.index))], index=self.index, name=currency,
+                         dtype=object)
+
+    def to_ohlc_frame(self):
+        if len(self.columns) == 0:
+            return pd.DataFrame(index=self.index)
+        return pd.concat([self.ohlc_series(c) for c in self.columns], axis=1, keys=list(self.columns))
+
+    def take(self, rows=slice(None), columns=None):
+        '''Row/column subset; basic slices return views over the same arrays'''
+        cols = slice(None) if columns is None else [self.columns.get_loc(c) for c in columns]
+        return PriceCube(self.index[rows], self.columns[cols],
+                         *[getattr(self, f)[rows][:, cols] for f in self.fields])
+
+    def reindex(self, index):
+        positions = self.index.get_indexer(index)
+        missing = positions < 0
+        arrays = []
+        for f in self.fields:
+            arr = getattr(self, f)[positions]
+            arr[missing] = np.nan
+            arrays.append(arr)
+        return PriceCube(index, self.columns, *arrays)
+
+    def fill(self):
+        '''Forward then backward fill gaps, mirroring the ffill/bfill applied to the Ohlc frames'''
+        arrays = [self.field(f).ffill().bfill().values for f in self.fields]
+        return PriceCube(self.index, self.columns, *arrays)
+
+    @classmethod
+    def from_field_frames(cls, open, high, low, close, volume=None):
+        return cls(open.index, open.columns, open.values, high.values, low.values, close.values,
+                   None if volume is None else volume.values)
+
+    @classmethod
+    def from_close(cls, close_df):
+        values = close_df.values
+        return cls(close_df.index, close_df.columns, values, values, values, values)
+
+    @classmethod
+    def from_ohlc_frame(cls, ohlc_df):
+        return cls(ohlc_df.index, ohlc_df.columns, *[ohlc_field(ohlc_df, f).values for f in cls.fields])
+
+    @classmethod
+    def from_pair_frames(cls, pair_frames):
+        '''
+        Builds a cube from per pair candle frames (columns open, high, low, close[, volume]).
+        Like joining Ohlc series, every pair is aligned to the index of the first one.
+        '''
+        pairs = list(pair_frames.keys())
+        if not pairs:
+            return cls([], [], *[np.empty((0, 0))] * 4)
+        index = pair_frames[pairs[0]].index
+        aligned = [pair_frames[p].reindex(index) for p in pairs]
+        arrays = []
+        for f in cls.fields:
+            arrays.append(np.column_stack([a[f].values if f in a else np.zeros(len(index)) for a in aligned]))
+        return cls(index, pairs, *arrays)
+
+
+def ohlc_field(data, field):
+    '''
+    Extracts a float field from a PriceCube/PriceWindow or from pandas objects holding Ohlc cells.
+    '''
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        # one pass over the cells' array rather than a pandas apply per cell
+        values = np.frompyfunc(lambda x: getattr(x, field, np.nan), 1, 1)(data.values).astype(np.float64)
+        if isinstance(data, pd.Series):
+            return pd.Series(values, index=data.index, name=data.name)
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+    return data.field(field)
+
+
+def as_price_cube(rates):
+    return rates if isinstance(rates, PriceCube) else PriceCube.from_ohlc_frame(rates)
+
+
+def as_ohlc_frame(rates):
+    return rates.to_ohlc_frame() if isinstance(rates, PriceCube) else rates
+
+
+class PriceWindow:
+    '''
+    One pair's bars [start, stop) of a PriceCube. Field access returns views over the cube's arrays, so
+    handing a strategy "history up to now" costs nothing; Ohlc objects are only built when indexed.
+    '''
+    def __init__(self, cube, column, start, stop):
+        self.cube = cube
+        self.column = column
+        self.start = start
+        self.stop = stop
+
+    @property
+    def name(self):
+        return self.cube.columns[self.column]
+
+    @property
+    def index(self):
+        return self.cube.index[self.start:self.stop]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return (self.cube.ohlc(i, self.column) for i in range(self.start, self.stop))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise IndexError('PriceWindow only supports contiguous slices')
+            return PriceWindow(self.cube, self.column, self.start + start, self.start + max(start, stop))
+        position = key + len(self) if key < 0 else key
+        if not 0 <= position < len(self):
+            raise IndexError('PriceWindow index out of range')
+        return self.cube.ohlc(self.start + position, self.column)
+
+    def values(self, name):
+        return getattr(self.cube, name)[self.start:self.stop, self.column]
+
+    def field(self, name):
+        return pd.Series(self.values(name), index=self.index, name=self.name, copy=False)
+
+    def apply(self, func):
+        return pd.Series([func(candle) for candle in self], index=self.index, name=self.name)
+
+    def to_series(self):
+        return self.apply(lambda x: x)
+
+
+class PriceCursor:
+    '''
+    Walks a PriceCube bar by bar, cursor[currency] is the pair's history up to and including the current
+    bar, optionally bounded to the last lookback bars.
+    '''
+    def __init__(self, cube, lookback=None):
+        self.cube = cube
+        self.lookback = lookback
+        self.position = 0
+
+    def move_to(self, position):
+        self.position = position
+        return self
+
+    def __getitem__(self, currency):
+        return self.window(self.cube.columns.get_loc(currency))
+
+    def window(self, column):
+        stop = self.position + 1
+        start = 0 if self.lookback is None else max(0, stop - self.lookback)
+        return PriceWindow(self.cube, column, start, stop)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from lab.core.structures import StopType
+
+
+def breach_mask(high, low, stop, long, spread=0.0):
+    '''Bars whose candle, widened by the spread, reaches the stop of a long (low side) or short (high side) line'''
+    if long:
+        return low - spread <= stop
+    return high + spread >= stop
+
+
+def first_breach(high, low, stop, long, start=0, spread=0.0, stop_type=StopType.Hard, checkable=None, block=64,
+                 end=None):
+    '''
+    Position of the first bar from start up to end whose candle breaches the stop, looking only at the bars
+    marked in checkable when it is given, or None if the stop is never hit. Soft stops are not triggered
+    by price so always give None. The search runs over doubling blocks so a close breach does not scan
+    the rest of the history.
+    '''
+    if stop_type is StopType.Soft:
+        return None
+    bars = len(high) if end is None else end
+    while start < bars:
+        block_end = min(start + block, bars)
+        hits = breach_mask(high[start:block_end], low[start:block_end], stop, long, spread)
+        if checkable is not None:
+            hits &= checkable[start:block_end]
+        if hits.any():
+            return start + int(np.argmax(hits))
+        start, block = block_end, block * 2
+    return None
+
+
+def first_breach_in_runs(high, low, stop, long, starts, ends, start=0, spread=0.0, stop_type=StopType.Hard):
+    '''first_breach looking only at the bars of the runs [starts[k], ends[k]), which are sorted and disjoint'''
+    if stop_type is StopType.Soft:
+        return None
+    for k in range(np.searchsorted(ends, start, side='right'), len(starts)):
+        breach = first_breach(high, low, stop, long, max(starts[k], start), spread, end=ends[k])
+        if breach is not None:
+            return breach
+    return None
@@ -1,4 +1,5 @@
 from enum import Enum
+import numpy as np
 import pandas as pd
 
 class InitError(Exception): pass
@@ -14,6 +15,9 @@ class StopType(Enum):
 
 
 class Ohlc:
+    # one of these is created per candle per pair, slots keep them small
+    __slots__ = ('date', 'open', 'high', 'low', 'close', 'volume')
+
     def __init__(self,open, high, low, close, date=None, volume=0):
         self.date = date
         self.open = open
@@ -27,6 +31,8 @@ class Ohlc:
 
 
 class TradeInstruction:
+    __slots__ = ('currency', 'price', 'stop', 'stop_type', 'risk', 'trade_date')
+
     def __init__(self, price, stop, risk, currency, trade_date, stop_type=StopType.Hard):
         self.currency = currency
         self.price = price
@@ -39,12 +45,131 @@ class TradeInstruction:
         return 'p=%s, s=%s, r=%s' % (self.price, self.stop, self.risk)
 
 
+class InstructionBook:
+    '''
+    Sparse trade instructions over a dates x currencies grid. Instructions that carry risk are events kept in
+    (date, currency) order with a row pointer per date, so the instructions of a date are one slice.
+    Cells with a stop but no risk only make the backtesters re-check the stops of open positions, they are
+    kept per currency as runs of dates [check_start, check_end). Cells without a stop do nothing and are dropped.
+    A book built from TradeInstructions keeps them and gives them back as its events.
+    '''
+    def __init__(self, index, columns, row, col, price, stop, risk, soft, check_col, check_start, check_end,
+                 instructions=None):
+        self.index = pd.Index(index)
+        self.columns = pd.Index(columns)
+        self.row = row
+        self.col = col
+        self.price = price
+        self.stop = stop
+        self.risk = risk
+        self.soft = soft
+        self.instructions = instructions
+        self.offsets = np.searchsorted(row, np.arange(len(self.index) + 1))
+        self.check_start = check_start
+        self.check_end = check_end
+        self.check_offsets = np.searchsorted(check_col, np.arange(len(self.columns) + 1))
+
+    @staticmethod
+    def runs(mask):
+        '''(column, start, end) of the runs of True down each column of a (dates x currencies) mask'''
+        padded = np.zeros((mask.shape[1], mask.shape[0] + 2), dtype=np.int8)
+        padded[:, 1:-1] = mask.T
+        edges = np.diff(padded, axis=1)
+        col, start = np.nonzero(edges == 1)
+        end = np.nonzero(edges == -1)[1]
+        return col, start, end
+
+    @classmethod
+    def from_arrays(cls, index, columns, price, stop, risk, soft=None, instructions=None):
+        '''
+        From dense (dates x currencies) arrays, soft marks the cells with a soft stop and instructions, when
+        given, holds the TradeInstruction of every cell with risk
+        '''
+        with np.errstate(invalid='ignore'):
+            has_stop = ~np.isnan(stop)
+            has_risk = has_stop & ~np.isnan(risk) & (risk != 0)
+        row, col = np.nonzero(has_risk)
+        soft = np.zeros(len(row), dtype=bool) if soft is None else soft[row, col]
+        instructions = None if instructions is None else instructions[row, col]
+        return cls(index, columns, row, col, price[row, col], stop[row, col], risk[row, col], soft,
+                   *cls.runs(has_stop & ~has_risk), instructions=instructions)
+
+    @classmethod
+    def from_frames(cls, price_df, risk_df, stop_df, stop_type=StopType.Hard):
+        soft = np.full(price_df.shape, stop_type is StopType.Soft)
+        return cls.from_arrays(price_df.index, price_df.columns, price_df.values.astype(float),
+                               stop_df.values.astype(float), risk_df.values.astype(float), soft)
+
+    @classmethod
+    def from_trade_details(cls, trade_details_df):
+        '''From a dates x currencies frame holding a TradeInstruction where there is something to do'''
+        cells = trade_details_df.values
+        shape = cells.shape
+        price, stop, risk = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+        soft = np.zeros(shape, dtype=bool)
+        # only the filled cells are looked at
+        for i, j in zip(*np.nonzero(~pd.isnull(cells))):
+            instruction = cells[i, j]
+            if type(instruction) is TradeInstruction:
+                price[i, j], stop[i, j], risk[i, j] = instruction.price, instruction.stop, instruction.risk
+                soft[i, j] = instruction.stop_type is StopType.Soft
+        return cls.from_arrays(trade_details_df.index, trade_details_df.columns, price, stop, risk, soft,
+                               instructions=cells)
+
+    def __len__(self):
+        return len(self.row)
+
+    def events(self, i):
+        '''Event positions of the i-th date'''
+        return range(self.offsets[i], self.offsets[i + 1])
+
+    def instruction(self, k):
+        # a new instruction every time, positions change the risk of the instructions they are given
+        if self.instructions is not None:
+            given = self.instructions[k]
+            return TradeInstruction(given.price, given.stop, given.risk, given.currency, given.trade_date,
+                                    given.stop_type)
+        return TradeInstruction(self.price[k], self.stop[k], self.risk[k], self.columns[self.col[k]],
+                                self.index[self.row[k]], StopType.Soft if self.soft[k] else StopType.Hard)
+
+    def checks(self, j):
+        '''(starts, ends) of the runs of dates on which the j-th currency's stops are re-checked'''
+        k = slice(self.check_offsets[j], self.check_offsets[j + 1])
+        return self.check_start[k], self.check_end[k]
+
+    def is_checkable(self, i, j):
+        starts, ends = self.checks(j)
+        k = np.searchsorted(starts, i, side='right') - 1
+        return k >= 0 and i < ends[k]
+
+    def on(self, date):
+        '''Instructions of a date, in currency order'''
+        return [self.instruction(k) for k in self.events(self.index.get_loc(date))]
+
+    def to_frame(self):
+        trade_details_df = pd.DataFrame(None, index=self.index, columns=self.columns, dtype=object)
+        for k in range(len(self)):
+            trade_details_df.iat[self.row[k], self.col[k]] = self.instruction(k)
+        return trade_details_df
+
+
 class BacktestContext():
 
-    def __init__(self, capital, currencyList):
+    def __init__(self, capital, currencyList, index=None):
         self.commission_per_k = 0.0
         self.spreadmap = []
         self.capital = capital
         self.positions = dict(map(lambda k: (k , []), currencyList))
-        self.nominal_attribution = pd.DataFrame()
-        self.pnl = pd.Series()
\ No newline at end of file
+        self.index = pd.Index([] if index is None else index)
+        self.currencies = list(currencyList)
+        # running buffers filled by bar position, see the frame views below
+        self.nominal_attribution_values = np.zeros((len(self.index), len(self.currencies)))
+        self.pnl_values = np.full(len(self.index), float(capital))
+
+    @property
+    def nominal_attribution(self):
+        return pd.DataFrame(self.nominal_attribution_values[1:], index=self.index[1:], columns=self.currencies)
+
+    @property
+    def pnl(self):
+        return pd.Series(self.pnl_values, index=self.index)
\ No newline at end of file
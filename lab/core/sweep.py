@@ -0,0 +1,153 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from lab.core.backtester import Backtester
+from lab.core.common import get_range
+from lab.core.price_cube import PriceCube, as_price_cube
+
+# grid parameters that configure the backtest rather than the strategy
+BACKTEST_PARAMS = ('capital', 'commission_per_k', 'use_spread')
+
+METRICS = ('final_equity', 'total_return', 'max_drawdown', 'sharpe', 'trades', 'win_rate')
+
+
+def parameter_grid(grid):
+    '''Every combination of a {name: values} grid as a list of {name: value}, the first name varying slowest'''
+    if not isinstance(grid, dict):
+        return [dict(params) for params in grid]
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[n] for n in names])]
+
+
+def summary_metrics(results_df, trades, capital, periods_per_year=252):
+    '''Headline numbers of a backtest from its results frame and closed trades'''
+    equity = results_df['PnL'].values.astype(np.float64)
+    pnls = np.array([t.pnl for t in trades if t is not None], dtype=np.float64)
+    if len(equity) == 0:
+        equity = np.array([float(capital)])
+    returns = equity[1:] / equity[:-1] - 1
+    std = returns.std(ddof=1) if len(returns) > 1 else np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = 1 - equity / np.maximum.accumulate(equity)
+    return {'final_equity': equity[-1],
+            'total_return': equity[-1] / capital - 1,
+            'max_drawdown': np.nanmax(drawdown),
+            'sharpe': returns.mean() / std * math.sqrt(periods_per_year) if std > 0 else np.nan,
+            'trades': len(pnls),
+            'win_rate': (pnls > 0).mean() if len(pnls) else np.nan}
+
+
+def share_cube(cube):
+    '''
+    Copies the cube's arrays (and a datetime index) into shared memory blocks. Returns the blocks, which the
+    caller must close and unlink, and a picklable spec attach_cube rebuilds the cube from without copying.
+    Fields holding the same array, as from_close gives, share one block.
+    '''
+    blocks, arrays, fields = [], {}, {}
+    shared = dict((f, getattr(cube, f)) for f in PriceCube.fields)
+    index = cube.index
+    if isinstance(index, pd.DatetimeIndex) and index.tz is None:
+        shared['index'] = index.values.astype('datetime64[ns]').view(np.int64)
+        index = None
+    for name, values in shared.items():
+        # views of the same memory with the same layout are the same array
+        key = (values.__array_interface__['data'][0], values.shape, values.strides, values.dtype.str)
+        if key not in arrays:
+            values = np.ascontiguousarray(values)
+            block = SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, values.dtype, buffer=block.buf)[...] = values
+            blocks.append(block)
+            arrays[key] = (block.name, values.shape, values.dtype.str)
+        fields[name] = arrays[key]
+    return blocks, {'fields': fields, 'index': index, 'columns': list(cube.columns)}
+
+
+def attach_cube(spec):
+    '''The cube of a share_cube spec over the shared blocks, returned with the blocks to keep them open'''
+    blocks, arrays = {}, {}
+    for name, (block_name, shape, dtype) in spec['fields'].items():
+        if block_name not in blocks:
+            blocks[block_name] = SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=blocks[block_name].buf)
+    index = spec['index'] if 'index' not in arrays else pd.DatetimeIndex(arrays['index'].view('datetime64[ns]'))
+    cube = PriceCube(index, spec['columns'], *[arrays[f] for f in PriceCube.fields])
+    return cube, list(blocks.values())
+
+
+# the sweep every worker runs, set once per process by the pool initializer
+_sweep_context = {}
+
+
+def _init_sweep_context(strategy_factory, spec, engine, capital, periods_per_year):
+    cube, blocks = attach_cube(spec)
+    _sweep_context.update(strategy_factory=strategy_factory, rates=cube, blocks=blocks, engine=engine,
+                          capital=capital, periods_per_year=periods_per_year)
+    # forked workers exit without running atexit hooks, multiprocessing's own finalizers run either way
+    util.Finalize(None, _release_sweep_context, exitpriority=0)
+
+
+def _release_sweep_context():
+    '''Drops the worker's views of the shared cube and closes its handles on the blocks, the sweep unlinks them'''
+    blocks = _sweep_context.get('blocks', [])
+    _sweep_context.clear()
+    for block in blocks:
+        block.close()
+
+
+def _run_combination(params):
+    c = _sweep_context
+    return run_combination(c['strategy_factory'], params, c['rates'], c['engine'], c['capital'],
+                           c['periods_per_year'])
+
+
+def run_combination(strategy_factory, params, rates, engine=Backtester, capital=10000, periods_per_year=252):
+    '''Backtests one combination of a sweep: the backtest parameters are split off, the rest build the strategy'''
+    strategy_params = dict((k, v) for k, v in params.items() if k not in BACKTEST_PARAMS)
+    capital = params.get('capital', capital)
+    backtester = engine(None, strategy_factory(**strategy_params))
+    results_df, trades = backtester.backtest_rates(capital, rates, params.get('commission_per_k', 0.0),
+                                                   params.get('use_spread', True))
+    return summary_metrics(results_df, trades, capital, periods_per_year)
+
+
+def sweep(strategy_factory, grid, rates=None, dataprovider=None, date_range=None, capital=10000, engine=Backtester,
+          max_workers=None, chunksize=None, periods_per_year=252):
+    '''
+    Backtests every combination of the parameter grid across a process pool, one row of summary metrics per
+    combination. strategy_factory(**params) builds the strategy from the grid parameters other than
+    capital, commission_per_k and use_spread, which go to the backtest.
+    The rates (or the dataprovider's, loaded once) are placed in shared memory that every worker maps, so
+    combinations do not pickle any price data. The factory is sent to the workers once and must be picklable
+    where processes are not forked. e.g.
+    sweep(LineReg_Tf, {'lookback': [21, 31, 41], 'commission_per_k': [0.0, 0.5]}, rates)
+    '''
+    if rates is None:
+        rates = dataprovider.get_price_cube()
+        rates = rates if date_range is None else get_range(rates, date_range[0], date_range[1])
+    rates = as_price_cube(rates)
+    combinations = parameter_grid(grid)
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, len(combinations) // (workers * 4))
+
+    blocks, spec = share_cube(rates)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_sweep_context,
+                                 initargs=(strategy_factory, spec, engine, capital, periods_per_year)) as pool:
+            metrics = list(pool.map(_run_combination, combinations, chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    names = list(dict.fromkeys(k for params in combinations for k in params))
+    table = pd.DataFrame(combinations, columns=names)
+    for metric in METRICS:
+        table[metric] = [m[metric] for m in metrics]
+    return table
@@ -6,12 +6,13 @@ from lab.core.common import get_pips, as_price
 from lab.core.structures import InitError
 from lab.core.structures import Direction
 from lab.core.pnl_line import PnlLine, ExitType
+from lab.core.pnl_history import PnlHistory
 
 
 class Transaction:
     def __init__(self, trade_details, capital, spread=0, commission_per_k=0.0):
         self.pip_value = 0.1
-        self.historic_pnl = []
+        self.historic_pnl = PnlHistory()
         self.commission_per_k = commission_per_k
         self.trade_details = trade_details
         self.spread = spread
@@ -24,8 +25,8 @@ class Transaction:
             -spread_as_price if self.direction is Direction.Long else spread_as_price)
         fill_details = self.calc_position_size_in_k(capital)
         self.position_sz = fill_details[0]
-        self.pnl = (-self.calculate_transaction_cost() * 2) + (
-            self.value_since_last_observation(self.fill_price, self.trade_details.price))
+        self.book_pnl((-self.calculate_transaction_cost() * 2) + (
+            self.value_since_last_observation(self.fill_price, self.trade_details.price)), trade_details.trade_date)
         # We Calculate transaction costs for getting in and out upfront
         self.true_stop_pips = fill_details[1]
         self.validate_construction()
@@ -50,8 +51,11 @@ class Transaction:
 
     @pnl.setter
     def pnl(self, value):
-        self.historic_pnl.append(value)
-        self.summary_pnl.pnl = sum(self.historic_pnl)
+        self.book_pnl(value)
+
+    def book_pnl(self, value, date=None):
+        self.historic_pnl.append(value, date)
+        self.summary_pnl.pnl = self.historic_pnl.total
 
     '''Assumption: price has no spread. Usage: to use potion size we say that if position size
     of 50k is worked out then for each pip move we make/lose 5 or 50*0.1'''
@@ -93,7 +97,7 @@ class Transaction:
 
         pnl_to_close = self.value_since_last_observation(fill_price, self.trade_details.price, -position_sz_to_close)
         # pnl_to_close -= self.calculate_transaction_cost(position_sz_to_close)
-        self.pnl = pnl_to_close
+        self.book_pnl(pnl_to_close, date)
         self.position_sz += position_sz_to_close
         self.risk += risk_to_close
 
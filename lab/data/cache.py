@@ -0,0 +1,127 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def write_columns(path, columns, meta):
+    '''
+    Stores each column as its own .npy file next to a json meta file. The meta file is written last and
+    records the row count, so a half written set of columns is detected and ignored by read_columns.
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    for name, values in columns.items():
+        tmp = '%s.%s.tmp.npy' % (path, name)
+        np.save(tmp, np.ascontiguousarray(values))
+        os.replace(tmp, '%s.%s.npy' % (path, name))
+
+    meta = dict(meta, columns=list(columns.keys()), rows=len(next(iter(columns.values()))) if columns else 0)
+    tmp = path + '.json.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path + '.json')
+
+
+def read_columns(path, mmap=True):
+    '''Returns (columns, meta), columns are memory mapped, or (None, None) if nothing valid is stored'''
+    try:
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        columns = dict((name, np.load('%s.%s.npy' % (path, name), mmap_mode='r' if mmap else None))
+                       for name in meta['columns'])
+    except (IOError, OSError, ValueError, KeyError):
+        return None, None
+
+    if any(len(v) != meta['rows'] for v in columns.values()):
+        return None, None
+    return columns, meta
+
+
+def utc_now():
+    return pd.Timestamp.utcnow().tz_localize(None)
+
+
+class CandleCache:
+    '''
+    Local columnar candle store keyed by instrument, granularity and price type. It remembers the date
+    range it covers, so a request only fetches the missing head and/or tail and merges it in. clock() gives
+    the current UTC time, the cache never covers the range beyond it.
+    '''
+    candle_columns = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, cache_dir, clock=utc_now):
+        self.cache_dir = cache_dir
+        self.clock = clock
+
+    def path(self, instrument, granularity, price_type):
+        return os.path.join(self.cache_dir, '%s_%s_%s' % (instrument, granularity, price_type))
+
+    def load(self, instrument, granularity, price_type):
+        columns, meta = read_columns(self.path(instrument, granularity, price_type))
+        if columns is None:
+            return None, None
+        return columns, (pd.Timestamp(meta['start']), pd.Timestamp(meta['end']))
+
+    def store(self, instrument, granularity, price_type, candles_df, start, end):
+        columns = {'time': candles_df.index.values.astype('datetime64[ns]').astype(np.int64)}
+        for name in self.candle_columns:
+            columns[name] = candles_df[name].values.astype(np.float64)
+        write_columns(self.path(instrument, granularity, price_type), columns,
+                      {'start': pd.Timestamp(start).isoformat(), 'end': pd.Timestamp(end).isoformat()})
+
+    def get(self, instrument, granularity, price_type, from_date, to_date, fetch):
+        '''
+        Candles between from_date and to_date, calling fetch(from_date, to_date) -> candles frame only for
+        the parts of the range the cache does not cover yet.
+        '''
+        start, end = pd.Timestamp(from_date), pd.Timestamp(to_date)
+        columns, covered = self.load(instrument, granularity, price_type)
+
+        if columns is None:
+            candles_df = fetch(from_date, to_date)
+            self.store(instrument, granularity, price_type, candles_df, start,
+                       self.covered_until(candles_df, start, end, self.clock()))
+            return candles_df[list(self.candle_columns)]
+
+        parts = []
+        new_start, new_end = covered
+        if start < covered[0]:
+            parts.append(fetch(from_date, covered[0].to_pydatetime()))
+            new_start = start
+        if end > covered[1]:
+            tail = fetch(covered[1].to_pydatetime(), to_date)
+            parts.append(tail)
+            new_end = self.covered_until(tail, covered[1], end, self.clock())
+
+        if parts:
+            merged = pd.concat([self.as_frame(columns)] + parts)
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+            self.store(instrument, granularity, price_type, merged, new_start, new_end)
+            columns, covered = self.load(instrument, granularity, price_type)
+
+        return self.as_frame(columns, start, end)
+
+    @staticmethod
+    def covered_until(candles_df, start, end, now):
+        '''
+        Where a fetch from start to end really covers the range to. Once the source has answered, the whole
+        range is covered, gaps such as weekends included, up to the time of the fetch and up to the first
+        candle still forming: the future and forming candles are fetched again next time. Frames without a
+        complete column only hold complete candles.
+        '''
+        covered = min(end, now)
+        if 'complete' in candles_df:
+            forming = candles_df.index[~candles_df['complete'].values.astype(bool)]
+            if len(forming):
+                covered = min(covered, forming[0])
+        return max(start, covered)
+
+    def as_frame(self, columns, start=None, end=None):
+        times = columns['time']
+        first = 0 if start is None else np.searchsorted(times, pd.Timestamp(start).value, side='left')
+        last = len(times) if end is None else np.searchsorted(times, pd.Timestamp(end).value, side='right')
+        # only the requested slice of the memory mapped columns is read from disk
+        return pd.DataFrame(dict((name, np.array(columns[name][first:last])) for name in self.candle_columns),
+                            index=pd.DatetimeIndex(np.array(times[first:last]).astype('datetime64[ns]')),
+                            columns=list(self.candle_columns))
@@ -1,5 +1,13 @@
+import datetime as dt
+import os
 from abc import ABCMeta, abstractmethod
+
+import numpy as np
+import pandas as pd
+
 from lab.core.structures import Ohlc
+from lab.core.price_cube import PriceCube
+from lab.data.cache import read_columns, write_columns
 
 import quandl as qdl
 
@@ -34,16 +42,26 @@ class DataProvider(object):
                 ]
 
     @abstractmethod
+    def get_price_cube(self):
+        '''PriceCube of every currency, built from the provider's numeric columns'''
+        raise NotImplementedError('Must implement get_price_cube()')
+
     def get_rates(self):
-        raise NotImplementedError('Must implement get_rates()')
+        return self.get_price_cube().to_ohlc_frame()
 
 
 class FREDDataProvider(DataProvider):
-    def __init__(self, use_exotics=False):
+    '''
+    Daily close only rates from FRED. All series are requested in one call to the quandl client and,
+    given a cache_dir, kept locally until the next day.
+    '''
+    def __init__(self, use_exotics=False, cache_dir=None, client=qdl):
 
         self.currencies = self.majors()
         if use_exotics:
             self.currencies.update(self.exotics())
+        self.cache_dir = cache_dir
+        self.client = client
 
     @staticmethod
     def majors():
@@ -75,23 +93,55 @@ class FREDDataProvider(DataProvider):
         >>> self.get_rate('DEXUSEU')
         AUDUSD dataframe
         '''
+        close_df = self.get_close(currency)
+        return pd.DataFrame(np.frompyfunc(lambda x: Ohlc(x, x, x, x), 1, 1)(close_df.values), index=close_df.index,
+                            columns=close_df.columns)
+
+    def get_close(self, currency):
         cur_code = self.currencies[currency]
-        currency_df = qdl.get('FRED/' + cur_code)
-        currency_df = currency_df.applymap(lambda x: Ohlc(x, x, x, x))
+        currency_df = self.client.get('FRED/' + cur_code)
         currency_df.rename(columns={'VALUE': currency}, inplace=True)
         return currency_df
 
-    def get_rates(self):
-        holding_dfs = []
-        for code in self.currencies.keys():
-            holding_dfs.append(self.get_rate(code))
-
-        index_cur_df = holding_dfs[0]
-
-        for df in holding_dfs[1:]:
-            index_cur_df = index_cur_df.join(df)
-
-        index_cur_df.ffill(inplace=True)
-        index_cur_df.bfill(inplace=True)
-
-        return index_cur_df
\ No newline at end of file
+    def get_closes(self):
+        '''
+        Float closes of every currency, one column each, aligned to the dates of the first currency and
+        filled forward then back
+        '''
+        close_df = self.load_closes()
+        if close_df is None:
+            close_df = self.fetch_closes()
+            self.store_closes(close_df)
+        return close_df.ffill().bfill()
+
+    def fetch_closes(self):
+        currencies = list(self.currencies.keys())
+        codes = ['FRED/' + self.currencies[c] for c in currencies]
+        close_df = self.client.get(codes)
+        # multi dataset columns come back as 'FRED/<code> - VALUE'
+        close_df = close_df.rename(columns=dict((col, currencies[codes.index(col.split(' - ')[0])])
+                                                for col in close_df.columns))[currencies].astype(np.float64)
+        return close_df[close_df[currencies[0]].notnull()]
+
+    def cache_path(self):
+        return os.path.join(self.cache_dir, 'FRED_' + '_'.join(self.currencies.keys()))
+
+    def load_closes(self):
+        if self.cache_dir is None:
+            return None
+        columns, meta = read_columns(self.cache_path())
+        if columns is None or meta.get('fetched') != dt.date.today().isoformat():
+            return None
+        return pd.DataFrame(dict((c, np.array(columns[c])) for c in self.currencies.keys()),
+                            index=pd.DatetimeIndex(np.array(columns['time']).astype('datetime64[ns]')),
+                            columns=list(self.currencies.keys()))
+
+    def store_closes(self, close_df):
+        if self.cache_dir is None:
+            return
+        columns = {'time': close_df.index.values.astype('datetime64[ns]').astype(np.int64)}
+        columns.update((c, close_df[c].values) for c in close_df.columns)
+        write_columns(self.cache_path(), columns, {'fetched': dt.date.today().isoformat()})
+
+    def get_price_cube(self):
+        return PriceCube.from_close(self.get_closes())
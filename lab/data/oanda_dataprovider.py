@@ -1,58 +1,153 @@
 import requests
 import datetime as dt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import numpy as np
+from lab.core.price_cube import PriceCube
 from lab.core.structures import Ohlc
+from lab.data.cache import CandleCache
 from lab.data.dataprovider import DataProvider
 
 
+OANDA_URL = 'https://api-fxtrade.oanda.com/v1'
+
+# candle length of each oanda granularity, monthly candles are taken at their longest
+GRANULARITY_SECONDS = {'S5': 5, 'S10': 10, 'S15': 15, 'S30': 30,
+                       'M1': 60, 'M2': 120, 'M3': 180, 'M4': 240, 'M5': 300, 'M10': 600, 'M15': 900, 'M30': 1800,
+                       'H1': 3600, 'H2': 7200, 'H3': 10800, 'H4': 14400, 'H6': 21600, 'H8': 28800, 'H12': 43200,
+                       'D': 86400, 'W': 604800, 'M': 2678400}
+
+
 def html_encode_numbers(arr):
     return tuple([str(a) if a > 9 else '0' + str(a) for a in arr])
 
 
 class OandaDataProvider(DataProvider):
 
-    def __init__(self, from_date, to_date, granularity):
+    def __init__(self, from_date, to_date, granularity, cache_dir=None, use_exotics=False, max_workers=8,
+                 base_url=OANDA_URL, max_candles=5000, chunk_workers=4, price_component='Mid'):
         self.from_date = from_date
         self.to_date = to_date
         self.granularity = granularity
+        # 'Mid', 'Bid' or 'Ask' prices, bid and ask candles come in the same bidask response
+        self.price_component = price_component
+        self.price_type = 'midpoint' if price_component == 'Mid' else 'bidask'
+        self.cache = None if cache_dir is None else CandleCache(cache_dir)
+        self.currencies = self.majors() + (self.exotics() if use_exotics else [])
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.max_candles = max_candles
+        self.chunk_workers = chunk_workers
+        self.session = self.create_session(max_workers * chunk_workers)
+
+    @staticmethod
+    def create_session(pool_size):
+        '''Keep-alive session whose connection pool is big enough for every worker to hold a connection'''
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
 
     '''
     gets currencies from oanda see for more information such as the different time granularities
     http://developer.oanda.com/rest-live/rates/#getCurrentPrices
     '''
-    def get_rates(self):
-        all_rates = [self.get_rate(cur, self.from_date, self.to_date, self.granularity) for cur in self.majors()]
-        all_rates_df = pd.DataFrame(all_rates[0])
-        for df in all_rates[1:]:
-            all_rates_df = all_rates_df.join(df)
+    def get_price_cube(self):
+        return PriceCube.from_pair_frames(self.get_all_candles()).fill()
 
-        all_rates_df.ffill(inplace=True)
-        all_rates_df.bfill(inplace=True)
-        return all_rates_df
+    def get_all_candles(self, currencies=None):
+        '''Candle frames of every currency keyed in order, fetched concurrently by max_workers threads'''
+        currencies = self.currencies if currencies is None else currencies
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            frames = pool.map(lambda cur: self.get_candles(cur, self.from_date, self.to_date, self.granularity),
+                              currencies)
+            return OrderedDict(zip(currencies, frames))
 
     def get_rate(self, currency, from_date=None, to_date=None, granularity='D'):
-        t = html_encode_numbers(to_date.timetuple()[:6])
-        f = html_encode_numbers(from_date.timetuple()[:6])
-        format_from = '' if from_date is None else ('&start=%s-%s-%sT%s:%s:%sZ' % f).replace(':','%3A')
-        format_to = '' if to_date is None else ('&end=%s-%s-%sT%s:%s:%sZ' % t).replace(':','%3A')
+        candles_df = self.get_candles(currency, from_date, to_date, granularity)
+        rates = [Ohlc(o, h, l, c, d, v) for d, o, h, l, c, v in
+                 zip(candles_df.index.values, candles_df['open'].values, candles_df['high'].values,
+                     candles_df['low'].values, candles_df['close'].values, candles_df['volume'].values)]
+        return pd.Series(rates, index=candles_df.index, name=currency, dtype=object)
+
+    def get_candles(self, currency, from_date=None, to_date=None, granularity='D'):
+        if self.cache is None or from_date is None or to_date is None:
+            return self.fetch_candles(currency, from_date, to_date, granularity)
+        cached_as = self.price_type if self.price_component == 'Mid' else self.price_component.lower()
+        return self.cache.get(currency, granularity, cached_as, from_date, to_date,
+                              lambda f, t: self.fetch_candles(currency, f, t, granularity))
+
+    def fetch_candles(self, currency, from_date=None, to_date=None, granularity='D'):
+        '''
+        Candles between the dates, requested in chunks of at most max_candles so long ranges are neither
+        truncated by the server nor parsed as one huge payload. Chunks are fetched by chunk_workers threads.
+        '''
+        chunks = self.chunk_ranges(from_date, to_date, granularity)
+        if len(chunks) == 1:
+            parts = [self.fetch_chunk(currency, chunks[0][0], chunks[0][1], granularity)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.chunk_workers) as pool:
+                parts = list(pool.map(lambda c: self.fetch_chunk(currency, c[0], c[1], granularity), chunks))
+        return self.stitch_chunks(parts)
+
+    def chunk_ranges(self, from_date, to_date, granularity):
+        if from_date is None or to_date is None:
+            return [(from_date, to_date)]
+        step = dt.timedelta(seconds=GRANULARITY_SECONDS[granularity] * self.max_candles)
+        start, end = pd.Timestamp(from_date).to_pydatetime(), pd.Timestamp(to_date).to_pydatetime()
+        chunks = []
+        while True:
+            chunk_end = min(start + step, end)
+            chunks.append((start, chunk_end))
+            if chunk_end >= end:
+                return chunks
+            start = chunk_end
+
+    def fetch_chunk(self, currency, from_date, to_date, granularity):
+        format_from = '' if from_date is None else \
+            ('&start=%s-%s-%sT%s:%s:%sZ' % html_encode_numbers(from_date.timetuple()[:6])).replace(':', '%3A')
+        format_to = '' if to_date is None else \
+            ('&end=%s-%s-%sT%s:%s:%sZ' % html_encode_numbers(to_date.timetuple()[:6])).replace(':', '%3A')
         format_currency = currency[:3] + '_' + currency[3:]
-        url = "https://api-fxtrade.oanda.com/v1/candles?instrument=%s%s%s&candleFormat=midpoint&granularity=%s" % \
-              (format_currency, format_from, format_to, granularity)
-        headers = {"Content-Type": "application/json"}
-        js = requests.get(url, headers=headers).json()
-        candles = js['candles']
-        rates = [self.parse_candle(candle) for candle in candles]
-        rate_dict = dict(zip([a.date for a in rates], rates))
-        rate_ser = pd.Series(rate_dict, name=currency)
-        return rate_ser
+        url = "%s/candles?instrument=%s%s%s&candleFormat=%s&granularity=%s" % \
+              (self.base_url, format_currency, format_from, format_to, self.price_type, granularity)
+        return self.decode_candles(self.session.get(url).json()['candles'], self.price_component)
+
+    @staticmethod
+    def decode_candles(candles, price_type='Mid'):
+        '''Decodes the candles of one response straight into typed column arrays, times as datetime64[ns]'''
+        columns = dict((name, np.fromiter((c[name + price_type] for c in candles), np.float64, len(candles)))
+                       for name in ('open', 'high', 'low', 'close'))
+        columns['volume'] = np.fromiter((c.get('volume', 0) for c in candles), np.float64, len(candles))
+        columns['complete'] = np.fromiter((c.get('complete', True) for c in candles), bool, len(candles))
+        # numpy parses the ISO 8601 times natively once the UTC 'Z' designator is dropped
+        columns['time'] = np.array([c['time'][:-1] for c in candles], dtype='datetime64[ns]')
+        return columns
+
+    @staticmethod
+    def stitch_chunks(parts):
+        '''
+        Joins chunk columns into one candle frame, a candle on a shared chunk boundary is kept once. The
+        complete column marks the candles that are no longer forming.
+        '''
+        times = np.concatenate([p['time'] for p in parts])
+        order = np.argsort(times, kind='mergesort')
+        times = times[order]
+        # last of every run of equal times
+        keep = np.append(times[1:] != times[:-1], True)
+        names = list(PriceCube.fields) + ['complete']
+        return pd.DataFrame(dict((name, np.concatenate([p[name] for p in parts])[order][keep]) for name in names),
+                            index=pd.DatetimeIndex(times[keep]), columns=names)
 
     @staticmethod
-    def parse_candle(candle):
-        price_type = 'Mid'
+    def parse_candle(candle, price_type='Mid'):
         o = candle['open' + price_type]
         h = candle['high' + price_type]
         l = candle['low' + price_type]
         c = candle['close' + price_type]
         d = np.datetime64(dt.datetime.strptime(candle['time'], '%Y-%m-%dT%H:%M:%S.%fZ'))
-        return Ohlc(o, h, l, c, d)
+        return Ohlc(o, h, l, c, d, candle.get('volume', 0))
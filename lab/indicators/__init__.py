@@ -1 +1,2 @@
-from lab.indicators.indicator import Indicator, ATR
\ No newline at end of file
+from lab.indicators.indicator import Indicator, ATR
+from lab.indicators.rolling import RollingMean, RollingStd, RollingMin, RollingMax
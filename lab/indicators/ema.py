@@ -2,29 +2,60 @@ import numpy as np
 import pandas as pd
 
 from lab import Indicator
+from lab.core.price_cube import ohlc_field
+from lab.indicators.indicator import seeded_recursive_average
 
 
 class EMA(Indicator):
     def __init__(self, periods=10):
         self.periods = periods
         self.smoothing_const = 2 / (periods + 1)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = np.nan
+
+    def update(self, candle):
+        price = candle.close
+        self.count += 1
+
+        if self.count <= self.periods:
+            self.seed_sum += price
+            if self.count == self.periods:
+                self.value = self.seed_sum / self.periods
+        else:
+            self.value = (1.0 - self.smoothing_const) * self.value + self.smoothing_const * price
+        return self.value
 
     def calculate(self, price_ser):
-        return self.calculate_dataframe(price_ser).ix[-1,'ema']
+        ema = self.smooth(ohlc_field(price_ser, 'close').to_frame())
+        return ema.iloc[-1, 0] if len(ema) else np.nan
 
     def calculate_dataframe(self, price_ser):
-        ser = price_ser.apply(lambda x: x.close)
+        ser = ohlc_field(price_ser, 'close')
         n_period_sma = ser.rolling(self.periods).mean()
         calc_df = pd.DataFrame({'price': ser, 'sma': n_period_sma})
-        calc_df['ema'] = np.nan
-
-        if len(calc_df) < self.periods:
-            return calc_df
-
-        calc_df.ix[self.periods - 1, 'ema'] =calc_df.ix[self.periods - 1, 'sma']
-        for i in range(self.periods, len(calc_df)):
-            c = calc_df.ix[i]
-            last_ema = calc_df.ix[i-1, 'ema']
-            calc_df.ix[i, 'ema'] = self.smoothing_const * (c['price'] - last_ema) + last_ema
-
-        return calc_df
\ No newline at end of file
+        calc_df['ema'] = self.smooth(ser.to_frame()).values
+        return calc_df
+
+    def calculate_all(self, rates):
+        '''EMA of the closes of every pair of an Ohlc frame or PriceCube, one column per pair'''
+        return self.smooth(ohlc_field(rates, 'close'))
+
+    def smooth(self, price_df):
+        # seeded with the simple average of the first window, which is the sma on that bar
+        seed = price_df.iloc[0:self.periods].mean(skipna=False).values
+        return seeded_recursive_average(price_df, (self.periods - 1, seed), self.smoothing_const)
+
+    @staticmethod
+    def calculate_periods(rates, periods):
+        '''
+        EMAs for several periods over the same rates, closes are unboxed once.
+        Returns a frame with (periods, pair) columns e.g. calculate_periods(rates, [10, 40])[10]['EURUSD']
+        '''
+        close_df = ohlc_field(rates, 'close')
+        if isinstance(close_df, pd.Series):
+            close_df = close_df.to_frame()
+        return pd.concat([EMA(p).smooth(close_df) for p in periods], axis=1, keys=list(periods))
@@ -1,7 +1,10 @@
+import copy
 import pandas as pd
 import numpy as np
 from abc import ABCMeta, abstractmethod
 
+from lab.core.price_cube import ohlc_field
+
 
 class Indicator(object):
     __metaclass__ = ABCMeta
@@ -14,46 +17,99 @@ class Indicator(object):
     def calculate_dataframe(self, price_ser):
         raise NotImplementedError('Must implement calculate_dataframe()')
 
+    '''
+    Streaming interface: update(candle) consumes one bar in O(1) and returns the value the batch
+    calculate_dataframe would give on that bar. snapshot()/restore() save and rewind that state.
+    '''
+    def update(self, candle):
+        raise NotImplementedError('Must implement update()')
+
+    def reset(self):
+        raise NotImplementedError('Must implement reset()')
+
+    def snapshot(self):
+        return copy.deepcopy(self.__dict__)
+
+    def restore(self, state):
+        self.__dict__.update(copy.deepcopy(state))
+
+
+def seeded_recursive_average(values, seed, alpha):
+    '''
+    Runs y[t] = y[t-1] + alpha * (x[t] - y[t-1]) down every column of values, starting from seed at the
+    row where seed is given (the seed row index is the position of seed within values).
+    Rows before the seed are NaN and, as with a bar by bar loop, a NaN input poisons every later output.
+    '''
+    seed_row, seed_values = seed
+    out = pd.DataFrame(np.nan, index=values.index, columns=values.columns)
+    if seed_row >= len(values):
+        return out
+
+    tail = values.iloc[seed_row:].copy()
+    tail.iloc[0] = seed_values
+    smoothed = tail.ewm(alpha=alpha, adjust=False).mean()
+    poisoned = tail.isnull().cumsum() > 0
+    out.iloc[seed_row:] = smoothed.where(~poisoned).values
+    return out
+
 
 class ATR(Indicator):
 
     def __init__(self, periods=14):
         self.periods=periods
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.tr_sum = 0.0
+        self.prev_close = np.nan
+        self.value = np.nan
+
+    def update(self, candle):
+        tr = candle.high - candle.low
+        if not np.isnan(self.prev_close):
+            tr = max(tr, abs(candle.high - self.prev_close), abs(candle.low - self.prev_close))
+        self.prev_close = candle.close
+        self.count += 1
+
+        if self.count <= self.periods:
+            self.tr_sum += tr
+            if self.count == self.periods:
+                self.value = self.tr_sum / self.periods
+        else:
+            self.value = (1.0 - 1.0 / self.periods) * self.value + tr / self.periods
+        return self.value
 
     def calculate(self, price_ser):
-        t_minus1 = price_ser.shift(1)
-        calc_df = pd.DataFrame({'t-1': t_minus1, 't': price_ser})
-        calc_df['tr'] = calc_df.apply(lambda x : self.true_range(x['t'], x['t-1']), axis=1)
-        calc_df['atr'] = np.nan
-
+        calc_df = self.true_range_frame(price_ser)
         if len(calc_df) < self.periods:
             return calc_df['tr'].mean()
-
-        calc_df.ix[self.periods - 1, 'atr'] = calc_df.ix[0:self.periods, 'tr'].mean()
-        for i in range(self.periods, len(calc_df)):
-            calc_df.ix[i, 'atr'] = (calc_df.ix[i-1, 'atr'] * (self.periods - 1) + calc_df.ix[i, 'tr']) / self.periods
-
-        return calc_df.ix[-1, 'atr']
+        return self.wilder_smooth(calc_df).iloc[-1, 0]
 
     def calculate_dataframe(self, price_ser):
-        t_minus1 = price_ser.shift(1)
-        calc_df = pd.DataFrame({'t-1': t_minus1, 't': price_ser})
-        calc_df['tr'] = calc_df.apply(lambda x : self.true_range(x['t'], x['t-1']), axis=1)
-        calc_df['atr'] = np.nan
-
+        calc_df = self.true_range_frame(price_ser)
         if len(calc_df) < self.periods:
             return calc_df['tr'].mean()
 
-        calc_df.ix[self.periods - 1, 'atr'] = calc_df.ix[0:self.periods, 'tr'].mean()
-        for i in range(self.periods, len(calc_df)):
-            calc_df.ix[i, 'atr'] = (calc_df.ix[i-1, 'atr'] * (self.periods - 1) + calc_df.ix[i, 'tr']) / self.periods
-
+        calc_df['atr'] = self.wilder_smooth(calc_df[['tr']]).values
         return calc_df
 
-    def true_range(self, t, t_minus_1):
-        hl = t.high - t.low
-        has_t_minus_1 = not isinstance(t_minus_1, float) or not np.isnan(t_minus_1)
-        il = abs(t.high - t_minus_1.close) if has_t_minus_1 else 0
-        ih = abs(t.low - t_minus_1.close) if has_t_minus_1 else 0
-        return max(hl, il, ih)
-
+    def calculate_all(self, rates):
+        '''ATR of every pair of an Ohlc frame or PriceCube at once, one column per pair'''
+        tr_df = self.true_range(ohlc_field(rates, 'high'), ohlc_field(rates, 'low'), ohlc_field(rates, 'close'))
+        return self.wilder_smooth(tr_df)
+
+    def true_range_frame(self, price_ser):
+        tr = self.true_range(ohlc_field(price_ser, 'high'), ohlc_field(price_ser, 'low'),
+                             ohlc_field(price_ser, 'close'))
+        return pd.DataFrame({'tr': tr})
+
+    def wilder_smooth(self, tr_df):
+        seed = tr_df.iloc[0:self.periods].mean().values
+        return seeded_recursive_average(tr_df, (self.periods - 1, seed), 1.0 / self.periods)
+
+    @staticmethod
+    def true_range(high, low, close):
+        prev_close = close.shift(1)
+        # fmax skips the missing previous close on the first bar, leaving just high - low
+        return np.fmax(high - low, np.fmax((high - prev_close).abs(), (low - prev_close).abs()))
@@ -0,0 +1,97 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from lab.core.price_cube import ohlc_field
+from lab.indicators.indicator import Indicator
+
+
+def rolling_regression(values, periods, block=4096):
+    '''
+    Least squares line y = a*x + b over every trailing window of `periods` rows of every column, with x
+    running 0..periods-1 inside each window, from running sums of y, x*y and y*y.
+    The sums are re-anchored every `block` rows and taken on prices relative to the block's mean so they
+    stay small and slopes keep their precision on long histories.
+    Returns a dict of (rows x columns) arrays: slope, intercept, residual and prev_residual (distance of the
+    last two points from the line), std (ddof=1) and mean; rows before the first full window are NaN.
+    '''
+    y = np.asarray(values, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    rows, cols = y.shape
+    stats = dict((k, np.full((rows, cols), np.nan)) for k in
+                 ('slope', 'intercept', 'residual', 'prev_residual', 'std', 'mean'))
+    if periods < 2 or rows < periods:
+        return stats
+
+    x_mean = (periods - 1) / 2.0
+    sxx = periods * (periods * periods - 1) / 12.0
+    for first in range(periods - 1, rows, block):
+        last = min(first + block, rows)
+        seg = y[first - periods + 1:last]
+        missing = np.isnan(seg)
+        with warnings.catch_warnings():
+            # all NaN columns just fall back to a zero reference
+            warnings.simplefilter('ignore', RuntimeWarning)
+            ref = np.nanmean(seg, axis=0)
+        ref = np.where(np.isnan(ref), 0.0, ref)
+        centred = np.where(missing, 0.0, seg - ref)
+        k = np.arange(len(seg), dtype=np.float64)[:, None]
+
+        sum_y = _window_sums(centred, periods)
+        sum_ky = _window_sums(k * centred, periods)
+        sum_yy = _window_sums(centred * centred, periods)
+        nan_count = _window_sums(missing.astype(np.float64), periods)
+
+        starts = np.arange(len(sum_y), dtype=np.float64)[:, None]
+        mean = sum_y / periods
+        sxy = (sum_ky - starts * sum_y) - periods * x_mean * mean
+        slope = sxy / sxx
+        var = np.maximum(sum_yy - sum_y * mean, 0.0) / (periods - 1)
+
+        end_y = centred[periods - 1:]
+        prev_y = centred[periods - 2:-1]
+        invalid = nan_count > 0
+        out = slice(first, last)
+        stats['slope'][out] = np.where(invalid, np.nan, slope)
+        stats['mean'][out] = np.where(invalid, np.nan, mean + ref)
+        stats['intercept'][out] = np.where(invalid, np.nan, mean + ref - slope * x_mean)
+        stats['residual'][out] = np.where(invalid, np.nan, end_y - mean - slope * x_mean)
+        stats['prev_residual'][out] = np.where(invalid, np.nan, prev_y - mean - slope * (x_mean - 1))
+        stats['std'][out] = np.where(invalid, np.nan, np.sqrt(var))
+    return stats
+
+
+def _window_sums(arr, periods):
+    cum = np.vstack([np.zeros((1, arr.shape[1])), np.cumsum(arr, axis=0)])
+    return cum[periods:] - cum[:-periods]
+
+
+class RollingRegression(Indicator):
+    '''
+    Rolling linear regression of one ohlc field. Row t holds the fit of the window ending on (and including)
+    bar t, see rolling_regression for the statistics.
+    '''
+    def __init__(self, periods=30, field='open'):
+        self.periods = periods
+        self.field = field
+
+    def calculate(self, price_ser):
+        return self.calculate_dataframe(price_ser)['slope'].iloc[-1]
+
+    def calculate_dataframe(self, price_ser):
+        return self.fit(ohlc_field(price_ser, self.field))
+
+    def calculate_all(self, rates):
+        '''All pairs at once, columns are (statistic, pair) e.g. calculate_all(rates)['slope']['EURUSD']'''
+        return self.fit(ohlc_field(rates, self.field))
+
+    def fit(self, prices):
+        '''Fits already unboxed float prices: a Series gives statistic columns, a DataFrame (statistic, pair)'''
+        stats = rolling_regression(prices.values, self.periods)
+        if isinstance(prices, pd.Series):
+            return pd.DataFrame(dict((k, v[:, 0]) for k, v in stats.items()), index=prices.index,
+                                columns=list(stats.keys()))
+        return pd.concat(dict((k, pd.DataFrame(v, index=prices.index, columns=prices.columns))
+                              for k, v in stats.items()), axis=1, keys=list(stats.keys()))
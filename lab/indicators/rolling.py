@@ -0,0 +1,152 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from lab.core.price_cube import ohlc_field
+from lab.indicators.indicator import Indicator
+
+
+class RollingIndicator(Indicator):
+    '''
+    Rolling window statistic over one ohlc field. The batch methods use pandas rolling windows, update()
+    keeps running window state so each new bar costs O(1). Any NaN inside the window gives NaN, as pandas does.
+    '''
+    name = None
+
+    def __init__(self, periods=10, field='close'):
+        self.periods = periods
+        self.field = field
+        self.reset()
+
+    def calculate(self, price_ser):
+        return self.calculate_dataframe(price_ser)[self.name].iloc[-1]
+
+    def calculate_dataframe(self, price_ser):
+        ser = ohlc_field(price_ser, self.field)
+        return pd.DataFrame({'price': ser, self.name: self.rolling_value(ser)})
+
+    def calculate_all(self, rates):
+        return self.rolling_value(ohlc_field(rates, self.field))
+
+    def rolling_value(self, values):
+        return getattr(values.rolling(self.periods), self.name)()
+
+    def reset(self):
+        self.window = deque()
+        self.nan_count = 0
+        self.count = 0
+        self.reset_window_state()
+
+    def update(self, candle):
+        value = getattr(candle, self.field)
+        self.window.append(value)
+        self.count += 1
+        if np.isnan(value):
+            self.nan_count += 1
+        else:
+            self.add(value)
+
+        if len(self.window) > self.periods:
+            expired = self.window.popleft()
+            if np.isnan(expired):
+                self.nan_count -= 1
+            else:
+                self.remove(expired)
+
+        if len(self.window) < self.periods or self.nan_count:
+            return np.nan
+        return self.current()
+
+    def reset_window_state(self):
+        raise NotImplementedError('Must implement reset_window_state()')
+
+    def add(self, value):
+        raise NotImplementedError('Must implement add()')
+
+    def remove(self, value):
+        raise NotImplementedError('Must implement remove()')
+
+    def current(self):
+        raise NotImplementedError('Must implement current()')
+
+
+class RollingMean(RollingIndicator):
+    name = 'mean'
+
+    def reset_window_state(self):
+        self.total = 0.0
+
+    def add(self, value):
+        self.total += value
+
+    def remove(self, value):
+        self.total -= value
+
+    def current(self):
+        return self.total / self.periods
+
+
+class RollingStd(RollingIndicator):
+    '''Sample standard deviation (ddof=1) kept with Welford add/remove updates'''
+    name = 'std'
+
+    def reset_window_state(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        self.n -= 1
+        if self.n == 0:
+            self.reset_window_state()
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (value - self.mean)
+
+    def current(self):
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1)) if self.n > 1 else np.nan
+
+
+class RollingExtreme(RollingIndicator):
+    '''Monotonic deque of (bar number, value) whose front is always the window extreme'''
+
+    def reset_window_state(self):
+        self.candidates = deque()
+
+    def add(self, value):
+        while self.candidates and not self.keeps(self.candidates[-1][1], value):
+            self.candidates.pop()
+        self.candidates.append((self.count, value))
+
+    def remove(self, value):
+        if self.candidates and self.candidates[0][0] <= self.count - self.periods:
+            self.candidates.popleft()
+
+    def current(self):
+        return self.candidates[0][1]
+
+    def keeps(self, older, newer):
+        raise NotImplementedError('Must implement keeps()')
+
+
+class RollingMin(RollingExtreme):
+    name = 'min'
+
+    def keeps(self, older, newer):
+        return older < newer
+
+
+class RollingMax(RollingExtreme):
+    name = 'max'
+
+    def keeps(self, older, newer):
+        return older > newer
@@ -1,15 +1,18 @@
 from lab.strategy.strategy import Strategy
 from lab.core.position import Position
+from lab.core.price_cube import ohlc_field
 import matplotlib.pyplot as plt
 import numpy as np
 from lab.core.structures import TradeInstruction, Direction, StopType
 from typing import List
 import pandas as pd
 # import scipy
-import statsmodels.api as sm
+from lab.indicators.regression import RollingRegression
 
 
 class LineReg_Tf(Strategy):
+    fit_columns = ('slope', 'intercept', 'residual', 'prev_residual', 'std', 'mean')
+
     def __init__(self, lookback):
         self.lookback = lookback
 
@@ -29,8 +32,10 @@ class LineReg_Tf(Strategy):
                     l.trade_details.stop = stop
 
     def calculate_stop(self, data_ser: pd.Series, direction: Direction, risk = 0.01):
-        avg_price = data_ser[:self.lookback].apply(lambda x : x.open).mean()
+        avg_price = ohlc_field(data_ser[:self.lookback], 'open').mean()
+        return self.stop_from_average(avg_price, direction, risk)
 
+    def stop_from_average(self, avg_price, direction: Direction, risk = 0.01):
         stoploss_quotient = abs(risk * self.lookback / 252) + 1  # percent change per period
 
         if direction is Direction.Long:
@@ -39,46 +44,54 @@ class LineReg_Tf(Strategy):
             return avg_price / stoploss_quotient
 
     def run(self, rates : pd.DataFrame):
-        instructions = pd.DataFrame(None, rates.index, rates.columns, type(TradeInstruction))
-        for col in range(len(rates.columns)):
-            rates_ser = rates.ix[:,col]
-            instructions.ix[:,col] = self.get_regressions(rates_ser)
+        instructions = pd.DataFrame(None, rates.index, rates.columns, object)
+        opens_df = ohlc_field(rates, 'open')
+        # every window of every pair in one pass, shifted so bar i sees the fit of bars i-lookback..i-1
+        regressions = RollingRegression(self.lookback).fit(opens_df).shift(1)
+        for currency in rates.columns:
+            instructions[currency] = self.generate_instructions(opens_df[currency],
+                                                                regressions.xs(currency, axis=1, level=1))
         return instructions
 
-
     def get_regressions(self, rates_ser):
-        instructions = pd.Series(None, rates_ser.index, TradeInstruction, rates_ser.name)
-        for i in range(self.lookback, len(rates_ser) - self.lookback):
-            window_ser = rates_ser[i - self.lookback:i]
-            regr = self.regression(window_ser, instructions[:i])
+        opens = ohlc_field(rates_ser, 'open')
+        return self.generate_instructions(opens, RollingRegression(self.lookback).fit(opens).shift(1))
+
+    def generate_instructions(self, opens: pd.Series, regressions: pd.DataFrame):
+        instructions = pd.Series(None, opens.index, object, opens.name)
+        fits = list(zip(*[regressions[k].values for k in self.fit_columns]))
+        # net risk of the instructions emitted so far for this pair, carried forward instead of re-summed
+        current_position = 0.0
+        for i in range(self.lookback, len(opens) - self.lookback):
+            regr = self.trade_from_fit(fits[i], current_position)
             if not np.isnan(regr[0]):
-                new_instruction = TradeInstruction(rates_ser[i].open, regr[1], regr[0], rates_ser.name, rates_ser.index[i],StopType.Soft)
-                instructions[i] = new_instruction
+                new_instruction = TradeInstruction(opens.iloc[i], regr[1], regr[0], opens.name, opens.index[i],StopType.Soft)
+                instructions.iloc[i] = new_instruction
+                current_position += regr[0]
         return instructions
 
     def regression(self, data_ser, instructions_ser: pd.Series):
-        prices = data_ser.apply(lambda x: x.open)
+        '''Trade on the window data_ser given the instructions emitted so far, one step of get_regressions'''
+        opens = ohlc_field(data_ser, 'open')
+        fit = RollingRegression(len(opens)).fit(opens).iloc[-1]
+        current_position = instructions_ser.dropna().apply(lambda x: x.risk).sum()
+        return self.trade_from_fit(tuple(fit[k] for k in self.fit_columns), current_position)
+
+    def trade_from_fit(self, fit, current_position):
+        (a, b, last_delta, prev_delta, sd, avg_price) = fit
         days_in_year = 252
-        X = range(len(prices))
-        A = sm.add_constant(X)
-        sd = prices.std()
-        Y = prices.values
         profittake = 1.96
-        # Run regression y = ax + b
-        results = sm.OLS(Y, A).fit()
-        (b, a) = results.params
+        # Regression y = ax + b over the window, fitted by RollingRegression
         # Normalized slope
         # slope = (a / b) * days_in_year  # Daily return regression * 1 year
         true_slope = (a / b) * self.lookback  # Daily return regression * 1 year
         slope = -true_slope # Daily return regression * 1 year
-        # Currently how far away from regression line?
-        delta = Y - (np.dot(a, X) + b)
+        # Currently how far away from regression line? (last two points of the window)
         # Don't trade if the slope is near flat
         slope_min = 0.063 #0.252
         # Current gain if trading
         new_weight = np.NaN
         stop_price = np.NaN
-        current_position = instructions_ser.dropna().apply(lambda x: x.risk).sum()
         # Long but slope turns down, then exit or Short but slope turns upward, then exit
         if (current_position > 0 and slope < 0) or (current_position < 0 and 0 < slope):
             new_weight = -current_position
@@ -86,22 +99,22 @@ class LineReg_Tf(Strategy):
         # Trend is up
         if slope > slope_min:
             # Price crosses the regression line
-            if delta[-1] > 0 and delta[-2] < 0 and current_position == 0:
-                stop_price = self.calculate_stop(data_ser, Direction.Short)
+            if last_delta > 0 and prev_delta < 0 and current_position == 0:
+                stop_price = self.stop_from_average(avg_price, Direction.Short)
                 new_weight = (-slope/10)
             # Profit take, reaches the top of 95% bollinger band
-            if delta[-1] > profittake * sd and current_position > 0:
+            if last_delta > profittake * sd and current_position > 0:
                 new_weight = -current_position
 
         # Trend is down
         if slope < -slope_min:
             # Price crosses the regression line
-            if delta[-1] < 0 and delta[-2] > 0 and current_position == 0:
-                stop_price = self.calculate_stop(data_ser, Direction.Long)
+            if last_delta < 0 and prev_delta > 0 and current_position == 0:
+                stop_price = self.stop_from_average(avg_price, Direction.Long)
                 new_weight = (-slope/10)
 
             # Profit take, reaches the top of 95% bollinger band
-            if delta[-1] < - profittake * sd and current_position < 0:
+            if last_delta < - profittake * sd and current_position < 0:
                 new_weight = -current_position
 
         return (new_weight, stop_price, b, a, slope)
@@ -5,12 +5,15 @@ import numpy as np
 import pandas as pd
 
 from lab.core.position import Position
+from lab.core.price_cube import ohlc_field
 from lab.core.structures import BacktestContext
 from lab.indicators.indicator import ATR
 
 
 class Strategy(object):
     __metaclass__ = ABCMeta
+    # False when schedule() never touches open positions, so engines may skip the bars without instructions
+    schedules = True
 
     @abstractmethod
     def run(self, rates):
@@ -26,10 +29,6 @@ class ATRCalcDef:
         self.multiplier = multiplier
 
     def calc_stop_prices(self, risk_df, price_df, periods=7):
-        atr = ATR(periods=periods)
-        stop_df = pd.DataFrame(index=price_df.index, columns=price_df.columns)
-        for col in stop_df.columns:
-            atr_df = atr.calculate_dataframe(price_df[col]).shift(1)
-            atr_df['true_atr'] = risk_df[col].apply(lambda x: np.sign(x)) * atr_df['atr'] * self.multiplier
-            stop_df[col] = atr_df['true_atr']
-        return price_df.applymap(lambda x: x.open) - stop_df
+        atr_df = ATR(periods=periods).calculate_all(price_df).shift(1)
+        stop_df = np.sign(risk_df) * atr_df * self.multiplier
+        return ohlc_field(price_df, 'open') - stop_df
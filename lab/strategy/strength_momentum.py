@@ -7,10 +7,12 @@ from lab.core.position import Position
 from lab.core.common import  get_pips
 from lab.strategy.strategy import Strategy
 from lab.core.common import get_currency_pair_tuple, price_data_to_trade_lines
+from lab.core.price_cube import ohlc_field
 
 
 
 class StrengthMomentum(Strategy):
+    schedules = False
 
     def schedule(self, positions: List[Position], data_ser: pd.Series):
         pass
@@ -26,16 +28,32 @@ class StrengthMomentum(Strategy):
 
     @staticmethod
     def calc_rolling_risk(price_df, theoretical_r_df, max_r):
-        rows, cols = price_df.shape
-        currencies = price_df.columns.values
-        rolling_risk_df = theoretical_r_df.copy()
-        for currency in currencies:
-            p_ser = price_df[currency]
-            r_ser = rolling_risk_df[currency]
-            for x in range(1, rows):
-                expected_r = r_ser[x]
-                r_ser[x] = calc_real_risk(p_ser[x], p_ser[x - 1], r_ser[x - 1], expected_r, max_r)
-        return rolling_risk_df
+        '''
+        calc_real_risk applied down every column at once: the scan runs over rows, each step updates all
+        the pairs with array operations.
+        '''
+        prices = price_df.values.astype(np.float64)
+        expected = theoretical_r_df.values.astype(np.float64)
+        risk = expected.copy()
+        rows = len(risk)
+        with np.errstate(invalid='ignore'):
+            polarity = np.where(expected < 0, -1.0, 1.0)
+            # min() keeps its first argument unless the second is smaller, so a NaN cap never applies
+            real_max_r = np.abs(max_r * 100 * expected)
+            real_max_r[np.isnan(real_max_r)] = np.inf
+            agrees = ((prices[1:] > prices[:-1]) & (expected[1:] > 0)) | \
+                     ((prices[1:] < prices[:-1]) & (expected[1:] < 0))
+        # risk only builds up on the bars where price moved the expected way, otherwise it is carried
+        added = np.where(agrees, expected[1:], 0.0)
+        flat = expected == 0
+        for x in range(1, rows):
+            row = risk[x]
+            np.add(risk[x - 1], added[x - 1], out=row)
+            np.abs(row, out=row)
+            np.minimum(row, real_max_r[x], out=row)
+            np.multiply(row, polarity[x], out=row)
+            np.copyto(row, 0.0, where=flat[x])
+        return pd.DataFrame(risk, index=theoretical_r_df.index, columns=theoretical_r_df.columns)
 
     @staticmethod
     def calc_avg_closing_range(data_df, periods, avging_periods):
@@ -43,7 +61,7 @@ class StrengthMomentum(Strategy):
             window=avging_periods).mean()
 
     def calc_stop_prices(self, risk_df, rates_df, short_avg_period=7):
-        price_df = rates_df.applymap(lambda x: x.open)
+        price_df = ohlc_field(rates_df, 'open')
         avg_range = self.calc_avg_closing_range(price_df, periods=short_avg_period, avging_periods=28) / 2
         stop_pips_df = avg_range.apply(lambda x: get_pips(x))
         pip_mult_ar = [100 if get_currency_pair_tuple(x)[1] == 'JPY' else 10000 for x in price_df.columns.values]
@@ -51,7 +69,7 @@ class StrengthMomentum(Strategy):
         return price_df - stop_as_price_df
 
     def run_with_diagnostics(self, ohcl_rates):
-        rates = ohcl_rates.applymap(lambda x: x.open)
+        rates = ohlc_field(ohcl_rates, 'open')
         diagnostic = type('', (), {})()
         diagnostic.data_df = rates
         rows, cols = diagnostic.data_df.shape
@@ -60,8 +78,7 @@ class StrengthMomentum(Strategy):
         diagnostic.rolling_rel_df = get_rolling_weighted_returns(diagnostic.relative_returns_df, periods=self.lookback)
         diagnostic.ranked_rolling_df = diagnostic.rolling_rel_df.rank(axis=1, ascending=False)
         diagnostic.ranked_rolling_df.fillna(0, inplace=True)
-        diagnostic.theoretical_risk = diagnostic.ranked_rolling_df.apply(
-            lambda x: x.apply(lambda y: calc_expected_prc_pos(self.risk_per_trade, cols, y)))
+        diagnostic.theoretical_risk = calc_expected_prc_pos_df(self.risk_per_trade, cols, diagnostic.ranked_rolling_df)
         diagnostic.conventional_t_risk = convert_to_natural_pair_df(diagnostic.data_df.columns.values,
                                                                     diagnostic.theoretical_risk)
         diagnostic.rolling_risk = self.calc_rolling_risk(diagnostic.data_df, diagnostic.conventional_t_risk,
@@ -100,17 +117,17 @@ def get_base_quote_returns(df, only_benchmark=False, benchmark='USD'):
         return pd.concat([base_df, quote_df], axis=1)
 
 
-def get_relative_returns(data_df, with_benchmark=False):
-    returns_df = get_base_quote_returns(data_df[[0]], only_benchmark=True)
-
-    for col in data_df.columns[1:]:
-        col_returns_df = get_base_quote_returns(data_df[[col]], only_benchmark=True)
-        returns_df = returns_df.join(col_returns_df)
+def get_relative_returns(data_df, with_benchmark=False, benchmark='USD'):
+    '''Returns of every pair against the benchmark currency, pairs quoted the other way round are inverted'''
+    rets = get_returns(data_df)
+    bases = [get_currency_pair_tuple(x)[0] for x in data_df.columns.values]
+    quotes = [get_currency_pair_tuple(x)[1] for x in data_df.columns.values]
+    inverted = np.array([base != benchmark for base in bases])
+    returns_df = pd.DataFrame(np.where(inverted, -rets.values, rets.values), index=data_df.index,
+                              columns=[q + b if flip else b + q for b, q, flip in zip(bases, quotes, inverted)])
 
     if (with_benchmark):
-        benchmark_ser = returns_df.mean(axis=1)
-        benchmark_ser.name = 'USD'
-        returns_df = returns_df.join(benchmark_ser)
+        returns_df[benchmark] = returns_df.mean(axis=1)
 
     return returns_df
 
@@ -129,6 +146,16 @@ def calc_expected_prc_pos(risk, max_rank, x, risk_boundary=4):
         return 0.0
 
 
+def calc_expected_prc_pos_df(risk, max_rank, ranked_df, risk_boundary=4):
+    '''calc_expected_prc_pos over a whole frame of ranks'''
+    ranks = ranked_df.values.astype(np.float64)
+    ranks_invert = ranks - (max_rank + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = np.select([(ranks > 0) & (ranks < risk_boundary), ranks_invert > -risk_boundary],
+                             [risk / ranks, risk / ranks_invert], 0.0)
+    return pd.DataFrame(expected, index=ranked_df.index, columns=ranked_df.columns)
+
+
 def check_not_conventional(contra, conventions):
     return [x for x in conventions if get_currency_pair_tuple(x)[0] == contra]
 
@@ -146,17 +173,12 @@ def convert_to_natural_pair(original_pairs_array, benchmarked_ser):
 
 
 def convert_to_natural_pair_df(original_pairs_array, df):
-    conventional_df = df.apply(lambda x: convert_to_natural_pair(original_pairs_array, x))
-    new_cols = []
-    for x in conventional_df.columns.values:
-        benchmark_cur, contra_cur = get_currency_pair_tuple(x)
-        if (check_not_conventional(contra_cur, original_pairs_array)):
-            new_cols.append(contra_cur + benchmark_cur)
-        else:
-            new_cols.append(x)
-    conventional_df.columns = new_cols
-
-    return conventional_df
+    unnatural = [bool(check_not_conventional(get_currency_pair_tuple(x)[1], original_pairs_array))
+                 for x in df.columns.values]
+    signs = np.where(unnatural, -1.0, 1.0)
+    new_cols = [contra + benchmark if flip else benchmark + contra
+                for (benchmark, contra), flip in zip(map(get_currency_pair_tuple, df.columns.values), unnatural)]
+    return pd.DataFrame(df.values * signs, index=df.index, columns=new_cols)
 
 
 def calc_real_risk(p, p_minus1, current_r, expected_r, max_r):
@@ -1,8 +1,25 @@
+from typing import List
+
 from lab import Ohlc
+from lab.core.common import as_price
+from lab.core.structures import TradeInstruction, StopType
+from lab.strategy.strategy import Strategy
 import datetime as dt
+import numpy as np
 import pandas as pd
 
 
+class IdleStrategy(Strategy):
+    '''Leaves positions alone, defined at module level so it can be pickled into the workers'''
+    schedules = False
+
+    def run(self, rates):
+        return None
+
+    def schedule(self, positions, data_ser, context=None):
+        pass
+
+
 def ohcl(o, c, h, l):
     return Ohlc(o, h, l, c, dt.datetime.today())
 
@@ -16,3 +33,57 @@ def ohlc_series(data,name = 'TEST'):
     ser = pd.Series(data, range, name=name)
     return ser
 
+
+def create_dataframe_from_series(data : List[pd.Series]):
+    return pd.concat(data, axis=1, keys=[s.name for s in data])
+
+
+def create_traded_series(currency='GBPUSD'):
+    ser = ohlc_series([ohcl(1, 0.9980, 1.0010, 0.9979),
+                       ohcl(0.9980, 0.9962, 0.9994, 0.9950),
+                       ohcl(0.9952, 0.9970, 0.9982, 0.9948),
+                       ohcl(0.9970, 1.0060, 1.0061, 0.9948),  # Enter the trade at this point
+                       ohcl(1.0080, 1.0095, 1.0027, 1.0001),
+                       ohcl(1.0027, 1.018, 0.9975, 1.0003),  # Exit the trade at this point
+                       ohcl(0.9975, 1.0003, 0.9920, 0.9920), ], currency)
+    return ser
+
+
+def create_trade_details(rates, trades):
+    '''A grid with a TradeInstruction at the bar's open for every {(row, currency): (risk, stop_pips)}'''
+    details = pd.DataFrame(None, index=rates.index, columns=rates.columns, dtype=object)
+    for (i, currency), (risk, stop_pips) in trades.items():
+        price = rates[currency].iloc[i].open
+        details.at[rates.index[i], currency] = TradeInstruction(
+            price, price - np.sign(risk) * as_price(stop_pips, currency), risk, currency, rates.index[i])
+    return details
+
+
+def random_rates(seed, bars=250, currencies=('EURUSD', 'USDJPY', 'GBPUSD')):
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('2010-01-01', periods=bars)
+    rates = {}
+    for currency in currencies:
+        close = (110.0 if 'JPY' in currency else 1.3) * np.exp(np.cumsum(rng.normal(0, 0.008, bars)))
+        open = np.r_[close[0], close[:-1]]
+        rates[currency] = pd.Series([Ohlc(o, max(o, c) * 1.004, min(o, c) * 0.996, c, d)
+                                     for o, c, d in zip(open, close, index)], index=index, name=currency)
+    return pd.concat(rates, axis=1, keys=list(currencies))
+
+
+def random_trade_details(rates, seed, density=0.3):
+    '''Entries, adds, partial and full closes, flips, zero and missing risk, missing stops and soft stops'''
+    rng = np.random.RandomState(seed)
+    details = pd.DataFrame(None, index=rates.index, columns=rates.columns, dtype=object)
+    for currency in rates.columns:
+        for i in range(1, len(rates)):
+            if rng.rand() > density:
+                continue
+            price = rates[currency].iloc[i].open
+            risk = rng.choice([0.0, 0.0, 0.01, -0.01, 0.02, -0.005, np.nan])
+            distance = price * rng.uniform(0.003, 0.03)
+            stop = np.nan if rng.rand() < 0.1 else price - distance if risk > 0 else price + distance
+            stop_type = StopType.Soft if rng.rand() < 0.2 else StopType.Hard
+            details.at[rates.index[i], currency] = TradeInstruction(price, stop, risk, currency, rates.index[i],
+                                                                    stop_type)
+    return details
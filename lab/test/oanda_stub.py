@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+
+class StubOandaServer(ThreadingMixIn, HTTPServer):
+    '''
+    Local stand in for the Oanda v1 candles endpoint. Serves daily midpoint or bidask candles for any instrument,
+    skipping the dates listed in missing[instrument], truncated to `limit` candles per response like the real
+    server's count limit, and records every request it handles.
+    '''
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, missing=None, limit=None):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubOandaHandler)
+        self.delay = delay
+        self.missing = missing or {}
+        self.limit = limit
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%s/v1' % self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def candles(self, instrument, start, end, candle_format='midpoint'):
+        dates = pd.date_range(start.normalize(), end, freq='D')
+        missing = set(pd.Timestamp(d) for d in self.missing.get(instrument, []))
+        candles = []
+        for i, d in enumerate(dates):
+            if d in missing or d < start:
+                continue
+            price = 1.0 + d.dayofyear / 1000.0
+            candle = {'time': d.strftime('%Y-%m-%dT%H:%M:%S.000000Z'), 'volume': i + 1, 'complete': True}
+            # bid and ask a pip either side of the mid
+            for component, shift in ([('Mid', 0.0)] if candle_format == 'midpoint' else
+                                     [('Bid', -0.0001), ('Ask', 0.0001)]):
+                candle.update({'open' + component: price + shift, 'high' + component: price + 0.01 + shift,
+                               'low' + component: price - 0.01 + shift, 'close' + component: price + 0.005 + shift})
+            candles.append(candle)
+        return candles if self.limit is None else candles[:self.limit]
+
+
+class StubOandaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            query = dict((k, v[0]) for k, v in parse_qs(urlparse(self.path).query).items())
+            with server.lock:
+                server.requests.append(query)
+            time.sleep(server.delay)
+            instrument = query['instrument'].replace('_', '')
+            body = json.dumps({'instrument': query['instrument'], 'granularity': query.get('granularity'),
+                               'candles': server.candles(instrument, pd.Timestamp(query['start'][:-1]),
+                                                         pd.Timestamp(query['end'][:-1]),
+                                                         query.get('candleFormat', 'midpoint'))}).encode()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
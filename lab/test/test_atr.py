@@ -1,8 +1,10 @@
 import unittest
+import numpy as np
 import pandas as pd
 import datetime as dt
 from lab.indicators.indicator import ATR
 from lab.core.structures import Ohlc
+from lab.core.price_cube import PriceCube
 
 
 def date_range(numdays, date =dt.datetime(2016, 10, 20)):
@@ -50,4 +52,35 @@ class ATRTests(unittest.TestCase):
                          Ohlc(50.19, 50.19, 49.73, 50.03),
                          Ohlc(50.36, 50.36, 49.26, 50.31)], index=date_range(6))
         atr = sut.calculate(ser)
-        self.assertAlmostEqual(0.6872,atr)
\ No newline at end of file
+        self.assertAlmostEqual(0.6872,atr)
+
+    def test_calculate_all_should_match_per_series_calculation_for_each_pair(self):
+        sut = ATR(periods=3)
+        eurusd = pd.Series([Ohlc(50.19, 50.19, 49.87, 50.13),
+                            Ohlc(50.12, 50.12, 49.20, 49.53),
+                            Ohlc(49.66, 49.66, 48.90, 49.50),
+                            Ohlc(49.88, 49.88, 49.43, 49.75),
+                            Ohlc(50.19, 50.19, 49.73, 50.03)], index=date_range(5))
+        usdjpy = pd.Series([Ohlc(110.0, 110.5, 109.5, 110.2),
+                            Ohlc(110.2, 111.0, 110.0, 110.9),
+                            Ohlc(110.9, 111.2, 110.1, 110.3),
+                            Ohlc(110.3, 110.4, 109.0, 109.2),
+                            Ohlc(109.2, 109.9, 108.8, 109.5)], index=date_range(5))
+        rates = PriceCube.from_ohlc_frame(pd.concat([eurusd, usdjpy], axis=1, keys=['EURUSD', 'USDJPY']))
+        atr_df = sut.calculate_all(rates)
+        np.testing.assert_almost_equal(sut.calculate_dataframe(eurusd)['atr'].values, atr_df['EURUSD'].values)
+        np.testing.assert_almost_equal(sut.calculate_dataframe(usdjpy)['atr'].values, atr_df['USDJPY'].values)
+        self.assertAlmostEqual(sut.calculate(usdjpy), atr_df['USDJPY'].iloc[-1])
+
+    def test_calculate_dataframe_should_be_nan_before_period_is_filled(self):
+        sut = ATR(periods=5)
+        ser = pd.Series([Ohlc(50.19, 50.19, 49.87, 50.13),
+                         Ohlc(50.12, 50.12, 49.20, 49.53),
+                         Ohlc(49.66, 49.66, 48.90, 49.50),
+                         Ohlc(49.88, 49.88, 49.43, 49.75),
+                         Ohlc(50.19, 50.19, 49.73, 50.03),
+                         Ohlc(50.36, 50.36, 49.26, 50.31)], index=date_range(6))
+        atr = sut.calculate_dataframe(ser)['atr']
+        self.assertTrue(atr.iloc[:4].isnull().all())
+        self.assertAlmostEqual(0.584, atr.iloc[4])
+        self.assertAlmostEqual(0.6872, atr.iloc[5])
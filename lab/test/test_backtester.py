@@ -6,12 +6,14 @@ import numpy as np
 import pandas as pd
 
 import lab.test.helpers as hp
-from lab.core.backtester import Backtester2
-from lab.core.common import as_price
+from lab.core.backtester import Backtester, Backtester2
+from lab.core.common import as_price, get_range
+from lab.core.price_cube import as_price_cube
 from lab.core.position import Position
 from lab.core.structures import TradeInstruction, BacktestContext
 from lab.data.dataprovider import DataProvider
 from lab.strategy.strategy import Strategy
+from lab.strategy.strength_momentum import StrengthMomentum
 
 
 def create_ohcl_series():
@@ -22,15 +24,21 @@ def create_ohcl_series():
             hp.ohcl(1.0080, 1.018, 1.1093, 1.0001)]
     return hp.ohlc_series(data)
 
-def create_dataframe_from_series(data : List[pd.Series]):
-    return pd.concat(data, axis=1, keys=[s.name for s in data])
-
 class BacktesterTests(unittest.TestCase):
     def create_fake_dataprovider(self, data):
         dp = DataProvider()
-        dp.get_rates = MagicMock(return_value=data)
+        dp.get_price_cube = MagicMock(return_value=as_price_cube(data))
         return dp
 
+    def test_full_backtest_should_run_on_the_providers_price_cube(self):
+        rates = hp.random_rates(2, bars=120)
+        backtester = Backtester(self.create_fake_dataprovider(rates), StrengthMomentum(lookback=5))
+        expected, _ = backtester.backtest_rates(10000, get_range(rates, '2010-02-01', '2010-04-01'))
+        actual, _ = backtester.full_backtest(10000, date_range=('2010-02-01', '2010-04-01'))
+
+        pd.testing.assert_frame_equal(expected, actual)
+        self.assertNotEqual(10000, actual['PnL'].iloc[-1])
+
     def test_when_strategy_places_trade_with_no_transaction_costs_then_transactions_not_included_in_attribution(self):
         gbpusd = hp.ohlc_series([hp.ohcl(1, 0.9980, 1.0010, 0.9979),
             hp.ohcl(0.9980, 0.9962, 0.9994, 0.9950),
@@ -40,7 +48,7 @@ class BacktesterTests(unittest.TestCase):
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]))
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]))
         expected = [0,0,0,0]
         actual = results.nominal_attribution['GBPUSD'].values
         self.assertEquals(set(expected),set(actual))
@@ -54,7 +62,7 @@ class BacktesterTests(unittest.TestCase):
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
         expected = [0,0,-5,0]
         actual = results.nominal_attribution['GBPUSD'].values
         self.assertEquals(list(expected),list(actual))
@@ -67,68 +75,107 @@ class BacktesterTests(unittest.TestCase):
         self.assertTrue(results.nominal_attribution.empty)
 
     def test_when_strategy_places_trade_and_exits_trade_pnl_is_captured_in_attribution(self):
-        gbpusd = self.create_traded_series()
+        gbpusd = hp.create_traded_series()
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
         expected = [0,0,-5,0,28.5,0]
         actual = results.nominal_attribution['GBPUSD'].values
         np.testing.assert_almost_equal(list(expected),list(actual),decimal=3)
 
     def test_when_strategy_places_trade_and_exits_then_pct_attribution_is_correctly_calculated(self):
-        gbpusd = self.create_traded_series()
+        gbpusd = hp.create_traded_series()
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
         expected = [0,0,0,0,0.00570,0]
         actual = results.attribution['GBPUSD'].values
         np.testing.assert_almost_equal(list(expected),list(actual),decimal=3)
 
     def test_when_strategy_places_trade_and_exits_trade_pnl_is_captured_in_attribution(self):
-        gbpusd = self.create_traded_series()
+        gbpusd = hp.create_traded_series()
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
         expected = [0,0,-5,0,28.5,0]
         actual = results.nominal_attribution['GBPUSD'].values
         np.testing.assert_almost_equal(list(expected),list(actual),decimal=3)
 
 
     def test_when_strategy_places_trade_and_exits_trade_for_multiple_currencies_pnl_is_captured_in_attribution(self):
-        gbpusd = self.create_traded_series()
+        gbpusd = hp.create_traded_series()
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd]),commission_per_k=0.5)
         expected = [0,0,-5,0,28.5,0]
         actual = results.nominal_attribution['GBPUSD'].values
         np.testing.assert_almost_equal(list(expected),list(actual),decimal=3)
 
 
     def test_when_strategy_places_trade_and_exits_trade_for_multiple_currencies_pnl_is_captured_in_attribution(self):
-        gbpusd = self.create_traded_series('GBPUSD')
-        eurusd = self.create_traded_series('EURUSD')
+        gbpusd = hp.create_traded_series('GBPUSD')
+        eurusd = hp.create_traded_series('EURUSD')
         strtgy = SimpleMovingAvgStrategy()
 
         backtester = Backtester2(strtgy)
-        results = backtester.backtest(10000,price_data=create_dataframe_from_series([gbpusd,eurusd]),commission_per_k=0.5)
+        results = backtester.backtest(10000,price_data=hp.create_dataframe_from_series([gbpusd,eurusd]),commission_per_k=0.5)
         expected = [0,0,-10,0,57,0]
         actual = results.nominal_attribution.apply(sum, axis=1).values
         np.testing.assert_almost_equal(list(expected),list(actual),decimal=3)
 
 
-    def create_traded_series(self, currency='GBPUSD'):
-        ser = hp.ohlc_series([hp.ohcl(1, 0.9980, 1.0010, 0.9979),
-                                 hp.ohcl(0.9980, 0.9962, 0.9994, 0.9950),
-                                 hp.ohcl(0.9952, 0.9970, 0.9982, 0.9948),
-                                 hp.ohcl(0.9970, 1.0060, 1.0061, 0.9948),  # Enter the trade at this point
-                                 hp.ohcl(1.0080, 1.0095, 1.0027, 1.0001),
-                                 hp.ohcl(1.0027, 1.018, 0.9975, 1.0003),  # Exit the trade at this point
-                                 hp.ohcl(0.9975, 1.0003, 0.9920, 0.9920), ], currency)
-        return ser
+    def test_bounded_lookback_should_not_change_attribution_of_short_window_strategy(self):
+        gbpusd = hp.create_traded_series()
+        unbounded = Backtester2(SimpleMovingAvgStrategy()).backtest(
+            10000, price_data=hp.create_dataframe_from_series([gbpusd]), commission_per_k=0.5)
+        bounded = Backtester2(SimpleMovingAvgStrategy(), lookback=3).backtest(
+            10000, price_data=hp.create_dataframe_from_series([gbpusd]), commission_per_k=0.5)
+        np.testing.assert_almost_equal(list(unbounded.nominal_attribution['GBPUSD'].values),
+                                       list(bounded.nominal_attribution['GBPUSD'].values), decimal=3)
+
+    def test_results_should_cover_every_bar_after_the_first(self):
+        price_data = hp.create_dataframe_from_series([hp.create_traded_series('GBPUSD'),
+                                                      hp.create_traded_series('EURUSD')])
+        results = Backtester2(SimpleMovingAvgStrategy()).backtest(10000, price_data=price_data, commission_per_k=0.5)
+
+        self.assertEqual(list(price_data.index[1:]), list(results.attribution.index))
+        self.assertEqual(list(price_data.index[1:]), list(results.nominal_attribution.index))
+        self.assertEqual(['GBPUSD', 'EURUSD'], list(results.nominal_attribution.columns))
+        self.assertEqual(list(price_data.index), list(results.pnl.index))
+        np.testing.assert_almost_equal(10000 + results.nominal_attribution.sum(axis=1).cumsum().values,
+                                       results.pnl.values[1:])
+
+
+class LedgerBacktesterTests(unittest.TestCase):
+    def test_round_trip_should_book_pnl_on_exit_and_track_open_risk(self):
+        rates = hp.create_dataframe_from_series([hp.create_traded_series()])
+        details = hp.create_trade_details(rates, {(3, 'GBPUSD'): (0.01, 200), (5, 'GBPUSD'): (-0.01, 200)})
+
+        backtester = Backtester(None, MagicMock())
+        results, closed = backtester.backtest(10000, details, rates)
+
+        np.testing.assert_almost_equal([0, 0, 0, 0, 0, 28.5, 0], results['GBPUSD'].values)
+        np.testing.assert_almost_equal([10000] * 5 + [10028.5] * 2, results['PnL'].values)
+        np.testing.assert_almost_equal([0, 0, 0, 0.01, 0.01, 0, 0], backtester.open_risk['GBPUSD'].values)
+        self.assertEqual(1, len(closed))
+        self.assertAlmostEqual(28.5, closed[0].pnl)
+
+    def test_equity_should_sum_pnl_of_every_currency(self):
+        rates = hp.create_dataframe_from_series([hp.create_traded_series('GBPUSD'),
+                                                 hp.create_traded_series('EURUSD')])
+        details = hp.create_trade_details(rates, {(3, 'GBPUSD'): (0.01, 200), (5, 'GBPUSD'): (-0.01, 200),
+                                                  (3, 'EURUSD'): (-0.01, 200)})
+
+        results, closed = Backtester(None, MagicMock()).backtest(10000, details, rates, commission_per_k=0.5)
+
+        self.assertEqual(['GBPUSD', 'EURUSD', 'PnL'], list(results.columns))
+        np.testing.assert_almost_equal(10000 + results[['GBPUSD', 'EURUSD']].sum(axis=1).cumsum().values,
+                                       results['PnL'].values)
+        self.assertEqual(1, len(closed))
 
 
 class SimpleMovingAvgStrategy(Strategy):
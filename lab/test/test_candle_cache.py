@@ -0,0 +1,106 @@
+import datetime as dt
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lab.data.cache import CandleCache, read_columns
+from lab.data.oanda_dataprovider import OandaDataProvider
+
+
+class FakeCandleSource:
+    '''
+    Daily candles except on the missing dates. When `now` is set there are none after it and the candle
+    `now` falls in is still forming.
+    '''
+    def __init__(self, now=None, missing=()):
+        self.calls = []
+        self.now = now
+        self.missing = missing
+
+    def clock(self):
+        return pd.Timestamp.utcnow().tz_localize(None) if self.now is None else self.now
+
+    def fetch(self, from_date, to_date):
+        self.calls.append((pd.Timestamp(from_date), pd.Timestamp(to_date)))
+        dates = pd.date_range(from_date, to_date, freq='D')
+        dates = dates[~dates.isin(pd.DatetimeIndex(self.missing)) & (dates <= self.clock())]
+        prices = np.array([d.toordinal() / 1e6 for d in dates])
+        candles = pd.DataFrame({'open': prices, 'high': prices + 0.001, 'low': prices - 0.001, 'close': prices,
+                                'volume': np.ones(len(dates))}, index=dates,
+                               columns=['open', 'high', 'low', 'close', 'volume'])
+        if self.now is not None:
+            candles['complete'] = dates + pd.Timedelta(days=1) <= self.now
+        return candles
+
+
+class CandleCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.source = FakeCandleSource()
+        self.sut = CandleCache(self.cache_dir, clock=self.source.clock)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def get(self, from_date, to_date):
+        return self.sut.get('EURUSD', 'D', 'midpoint', from_date, to_date, self.source.fetch)
+
+    def test_repeated_request_should_be_served_from_cache(self):
+        first = self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 1))
+        second = self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 1))
+        self.assertEqual(1, len(self.source.calls))
+        pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+    def test_sub_range_should_be_served_from_cache(self):
+        self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 1))
+        candles = self.get(dt.date(2010, 1, 10), dt.date(2010, 1, 20))
+        self.assertEqual(1, len(self.source.calls))
+        self.assertEqual(11, len(candles))
+        self.assertEqual(pd.Timestamp(2010, 1, 10), candles.index[0])
+
+    def test_extended_range_should_only_fetch_missing_head_and_tail(self):
+        self.get(dt.date(2010, 2, 1), dt.date(2010, 3, 1))
+        candles = self.get(dt.date(2010, 1, 1), dt.date(2010, 4, 1))
+        self.assertEqual([(pd.Timestamp(2010, 1, 1), pd.Timestamp(2010, 2, 1)),
+                          (pd.Timestamp(2010, 3, 1), pd.Timestamp(2010, 4, 1))], self.source.calls[1:])
+        expected = self.source.fetch(dt.date(2010, 1, 1), dt.date(2010, 4, 1))
+        pd.testing.assert_frame_equal(expected, candles, check_freq=False)
+
+    def test_forming_candle_and_future_dates_should_not_be_covered(self):
+        self.source.now = pd.Timestamp(2010, 3, 1, 12)
+        first = self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 10))
+        self.assertEqual(['open', 'high', 'low', 'close', 'volume'], list(first.columns))
+        self.assertEqual(pd.Timestamp(2010, 3, 1), self.sut.load('EURUSD', 'D', 'midpoint')[1][1])
+
+        self.source.now = pd.Timestamp(2010, 3, 5, 12)
+        candles = self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 10))
+        self.assertEqual((pd.Timestamp(2010, 3, 1), pd.Timestamp(2010, 3, 10)), self.source.calls[-1])
+        self.assertEqual(pd.Timestamp(2010, 3, 5), candles.index[-1])
+        self.assertEqual(pd.Timestamp(2010, 3, 5), self.sut.load('EURUSD', 'D', 'midpoint')[1][1])
+
+    def test_range_ending_without_candles_should_be_covered(self):
+        # a weekend at the end of the range
+        self.source.missing = [dt.date(2010, 1, 30), dt.date(2010, 1, 31)]
+        for _ in range(4):
+            candles = self.get(dt.date(2010, 1, 1), dt.date(2010, 1, 31))
+        self.assertEqual(1, len(self.source.calls))
+        self.assertEqual(pd.Timestamp(2010, 1, 29), candles.index[-1])
+        self.assertEqual(pd.Timestamp(2010, 1, 31), self.sut.load('EURUSD', 'D', 'midpoint')[1][1])
+
+    def test_cached_columns_should_be_memory_mapped(self):
+        self.get(dt.date(2010, 1, 1), dt.date(2010, 3, 1))
+        columns, meta = read_columns(self.sut.path('EURUSD', 'D', 'midpoint'))
+        self.assertIsInstance(columns['close'], np.memmap)
+        self.assertEqual(60, meta['rows'])
+
+    def test_provider_should_fetch_through_cache(self):
+        provider = OandaDataProvider(dt.date(2010, 1, 1), dt.date(2010, 2, 1), 'D', cache_dir=self.cache_dir)
+        provider.fetch_candles = lambda currency, f, t, granularity: self.source.fetch(f, t)
+        provider.get_rate('EURUSD', provider.from_date, provider.to_date, 'D')
+        rates = provider.get_rate('EURUSD', provider.from_date, provider.to_date, 'D')
+        self.assertEqual(1, len(self.source.calls))
+        self.assertEqual(32, len(rates))
@@ -38,4 +38,29 @@ class EMATests(ut.TestCase):
                          Ohlc(50.19, 50.19, 49.73, 50.03),
                          Ohlc(50.04, 50.46, 49.97, 50.40)], index=date_range(6))
         ema = sut.calculate(ser)
-        self.assertAlmostEqual(49.992, ema)
\ No newline at end of file
+        self.assertAlmostEqual(49.992, ema)
+
+    def test_calculate_dataframe_should_seed_with_sma_and_be_nan_before(self):
+        sut = EMA(periods=5)
+        ser = pd.Series([Ohlc(50.19, 50.19, 49.87, 50.13),
+                         Ohlc(50.12, 50.12, 49.20, 49.53),
+                         Ohlc(49.66, 49.66, 48.90, 49.50),
+                         Ohlc(49.88, 49.88, 49.43, 49.75),
+                         Ohlc(50.19, 50.19, 49.73, 50.03),
+                         Ohlc(50.04, 50.46, 49.97, 50.40)], index=date_range(6))
+        calc_df = sut.calculate_dataframe(ser)
+        self.assertTrue(calc_df['ema'].iloc[:4].isnull().all())
+        self.assertAlmostEqual(calc_df['sma'].iloc[4], calc_df['ema'].iloc[4])
+        self.assertAlmostEqual(49.992, calc_df['ema'].iloc[5])
+
+    def test_calculate_periods_should_match_single_period_calculation_per_pair(self):
+        eurusd = pd.Series([Ohlc(1.0, 1.0, 1.0, c) for c in [1.10, 1.12, 1.11, 1.15, 1.14, 1.13, 1.18]],
+                           index=date_range(7))
+        usdjpy = pd.Series([Ohlc(1.0, 1.0, 1.0, c) for c in [110, 111, 109, 108, 112, 113, 111]],
+                           index=date_range(7))
+        rates = pd.concat([eurusd, usdjpy], axis=1, keys=['EURUSD', 'USDJPY'])
+        ema_df = EMA.calculate_periods(rates, [2, 4])
+        self.assertAlmostEqual(EMA(periods=2).calculate(usdjpy), ema_df[2]['USDJPY'].iloc[-1])
+        self.assertAlmostEqual(EMA(periods=4).calculate(eurusd), ema_df[4]['EURUSD'].iloc[-1])
+        np.testing.assert_almost_equal(EMA(periods=4).calculate_all(rates)['USDJPY'].values,
+                                       ema_df[4]['USDJPY'].values)
@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import lab.test.helpers as hp
+from lab.test.helpers import IdleStrategy
+from lab.core.backtester import Backtester
+from lab.core.common import price_data_to_trade_lines
+from lab.core.fast_backtester import FastBacktester
+from lab.core.pnl_line import ExitType
+from lab.core.price_cube import as_price_cube
+from lab.core.structures import TradeInstruction, InitError
+from lab.strategy.linreg_trend_follower import LineReg_Tf
+from lab.strategy.strength_momentum import StrengthMomentum
+
+
+class FastBacktesterTests(unittest.TestCase):
+
+    def assert_same_backtest(self, trade_details, rates, commission_per_k=0.0, spread_map=None):
+        backtester, fast = Backtester(None, IdleStrategy()), FastBacktester(None, IdleStrategy())
+        # instructions are mutated by positions so each engine gets its own copy
+        expected, expected_trades = backtester.backtest(10000, trade_details(), rates, commission_per_k, spread_map)
+        actual, actual_trades = fast.backtest(10000, trade_details(), rates, commission_per_k, spread_map)
+        self.assert_same_results(expected, expected_trades, backtester.open_risk, actual, actual_trades,
+                                 fast.open_risk)
+        return actual, actual_trades
+
+    def assert_same_results(self, expected, expected_trades, expected_risk, actual, actual_trades, actual_risk):
+        np.testing.assert_array_equal(expected.values, actual.values)
+        np.testing.assert_array_equal(expected_risk.values, actual_risk.values)
+        self.assertEqual(len(expected_trades), len(actual_trades))
+        for e, a in zip(expected_trades, actual_trades):
+            self.assertEqual((e.pnl, e.from_date, e.to_date, e.open_price, e.close_price, e.exit_type),
+                             (a.pnl, a.from_date, a.to_date, a.open_price, a.close_price, a.exit_type))
+            self.assertEqual([d.trade_date for d in e.details], [d.trade_date for d in a.details])
+
+    def test_round_trip_should_match_backtester(self):
+        rates = hp.create_dataframe_from_series([hp.create_traded_series()])
+        trades = {(3, 'GBPUSD'): (0.01, 200), (5, 'GBPUSD'): (-0.01, 200)}
+
+        results, closed = self.assert_same_backtest(lambda: hp.create_trade_details(rates, trades), rates)
+        np.testing.assert_almost_equal([10000] * 5 + [10028.5] * 2, results['PnL'].values)
+        self.assertEqual(1, len(closed))
+
+    def test_random_instruction_grids_should_match_backtester(self):
+        for seed in range(5):
+            rates = hp.random_rates(seed)
+            self.assert_same_backtest(lambda: hp.random_trade_details(rates, seed), rates, 0.5,
+                                      Backtester.spread_map())
+
+    def test_dense_instruction_grid_should_match_backtester(self):
+        rates = hp.random_rates(7, bars=400)
+        _, closed = self.assert_same_backtest(lambda: hp.random_trade_details(rates, 7, density=0.95), rates, 0.5,
+                                              Backtester.spread_map())
+        self.assertGreater(len(closed), 0)
+
+    def test_stop_outs_on_check_dates_should_match_backtester(self):
+        rates = hp.random_rates(3, bars=120, currencies=('EURUSD', 'USDJPY'))
+
+        def trade_details():
+            # tight stops re-checked on every bar, so positions are stopped out between instructions
+            details = pd.DataFrame(None, index=rates.index, columns=rates.columns, dtype=object)
+            for currency in rates.columns:
+                for i in range(1, len(rates)):
+                    price = rates[currency].iloc[i].open
+                    risk = 0.01 if i % 20 == 1 else 0.0
+                    details.iat[i, rates.columns.get_loc(currency)] = TradeInstruction(
+                        price, price * 0.995, risk, currency, rates.index[i])
+            return details
+
+        _, closed = self.assert_same_backtest(trade_details, rates, 0.5, Backtester.spread_map())
+        self.assertTrue(any(t.exit_type is ExitType.Stopped for t in closed))
+
+    def test_backtest_book_should_match_backtester(self):
+        rates = hp.random_rates(4, bars=300)
+        rng = np.random.RandomState(4)
+        prices = pd.DataFrame(dict((c, [candle.open for candle in rates[c]]) for c in rates.columns),
+                              index=rates.index)
+        risks = pd.DataFrame(rng.choice([0.0, 0.0, 0.0, 0.01, -0.01, np.nan], size=prices.shape),
+                             index=prices.index, columns=prices.columns)
+        stops = prices * np.where(risks > 0, 0.99, 1.01)
+        book = price_data_to_trade_lines(prices, risks, stops)
+
+        backtester, fast = Backtester(None, IdleStrategy()), FastBacktester(None, IdleStrategy())
+        expected, expected_trades = backtester.backtest(10000, book, rates, 0.5, Backtester.spread_map())
+        actual, actual_trades = fast.backtest_book(10000, book, as_price_cube(rates), 0.5, Backtester.spread_map())
+        self.assert_same_results(expected, expected_trades, backtester.open_risk, actual, actual_trades,
+                                 fast.open_risk)
+        self.assertGreater(len(actual_trades), 0)
+
+    def test_closes_should_net_off_the_oldest_lot_first(self):
+        rates = hp.create_dataframe_from_series([hp.create_traded_series()])
+        trades = {(1, 'GBPUSD'): (0.01, 200), (2, 'GBPUSD'): (0.005, 100), (4, 'GBPUSD'): (-0.012, 200),
+                  (5, 'GBPUSD'): (-0.003, 200)}
+
+        _, closed = self.assert_same_backtest(lambda: hp.create_trade_details(rates, trades), rates)
+        self.assertEqual(1, len(closed))
+        self.assertEqual([rates.index[1], rates.index[2]], [d.trade_date for d in closed[0].details])
+
+    def assert_same_strategy_backtest(self, strategy, rates):
+        backtester, fast = Backtester(None, strategy), FastBacktester(None, strategy)
+        expected, expected_trades = backtester.backtest_rates(10000, rates, 0.5)
+        actual, actual_trades = fast.backtest_rates(10000, rates, 0.5)
+        self.assert_same_results(expected, expected_trades, backtester.open_risk, actual, actual_trades,
+                                 fast.open_risk)
+        self.assertNotEqual(10000, actual['PnL'].iloc[-1])
+
+    def test_strength_momentum_run_should_match_backtester(self):
+        self.assert_same_strategy_backtest(StrengthMomentum(lookback=5), hp.random_rates(5, bars=300))
+
+    def test_linreg_run_should_match_backtester(self):
+        # schedule() moves the stops of open positions on every bar, so this one is replayed bar by bar
+        self.assert_same_strategy_backtest(LineReg_Tf(lookback=21), hp.random_rates(6, bars=300))
+
+    def test_inconsistent_instruction_should_raise(self):
+        rates = hp.create_dataframe_from_series([hp.create_traded_series()])
+        details = hp.create_trade_details(rates, {(3, 'GBPUSD'): (0.01, -200)})
+
+        self.assertRaises(InitError, FastBacktester(None, IdleStrategy()).backtest, 10000, details, rates)
+
+
+if __name__ == '__main__':
+    unittest.main()
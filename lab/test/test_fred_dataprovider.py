@@ -0,0 +1,95 @@
+import datetime as dt
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from lab.core.structures import Ohlc
+from lab.data.dataprovider import FREDDataProvider
+
+
+class StubQuandlClient:
+    '''Stands in for the quandl module, answering multi dataset requests in quandl's column format'''
+
+    def __init__(self, dates=pd.date_range('2016-01-01', periods=10)):
+        self.dates = dates
+        self.calls = []
+
+    def get(self, codes):
+        self.calls.append(codes)
+        if isinstance(codes, str):
+            return pd.DataFrame({'VALUE': self.values(codes)}, index=self.dates)
+        frame = pd.DataFrame(dict((code + ' - VALUE', self.values(code)) for code in codes), index=self.dates)
+        return frame[[code + ' - VALUE' for code in reversed(codes)]]
+
+    def values(self, code):
+        values = np.arange(len(self.dates)) + sum(map(ord, code)) / 100.0
+        if code == 'FRED/DEXUSAL':
+            values[[0, 4]] = np.nan
+        if code == 'FRED/DEXUSEU':
+            values[7] = np.nan
+        return values
+
+
+class FREDDataProviderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.client = StubQuandlClient()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_closes_should_request_all_series_in_one_call(self):
+        sut = FREDDataProvider(use_exotics=True, client=self.client)
+        close_df = sut.get_closes()
+
+        self.assertEqual(1, len(self.client.calls))
+        self.assertEqual(list(sut.currencies.keys()), list(close_df.columns))
+        self.assertEqual(np.float64, close_df.values.dtype)
+        np.testing.assert_array_almost_equal(self.client.values('FRED/DEXMXUS')[[0, 1, 2, 3, 4, 5, 6, 8, 9]],
+                                             close_df['USDMXN'].values)
+
+    def test_get_closes_should_align_to_first_currency_and_fill(self):
+        close_df = FREDDataProvider(client=self.client).get_closes()
+
+        self.assertEqual(9, len(close_df))
+        self.assertNotIn(pd.Timestamp('2016-01-08'), close_df.index)
+        self.assertEqual(close_df['AUDUSD'].iloc[1], close_df['AUDUSD'].iloc[0])
+        self.assertEqual(close_df['AUDUSD'].iloc[3], close_df['AUDUSD'].iloc[4])
+
+    def test_get_closes_should_be_served_from_cache_on_the_same_day(self):
+        first = FREDDataProvider(client=self.client, cache_dir=self.cache_dir).get_closes()
+        second = FREDDataProvider(client=self.client, cache_dir=self.cache_dir).get_closes()
+
+        self.assertEqual(1, len(self.client.calls))
+        pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+    def test_get_closes_should_refetch_cache_from_a_previous_day(self):
+        sut = FREDDataProvider(client=self.client, cache_dir=self.cache_dir)
+        sut.get_closes()
+        with open(sut.cache_path() + '.json') as f:
+            meta = json.load(f)
+        meta['fetched'] = (dt.date.today() - dt.timedelta(days=1)).isoformat()
+        with open(sut.cache_path() + '.json', 'w') as f:
+            json.dump(meta, f)
+
+        sut.get_closes()
+        self.assertEqual(2, len(self.client.calls))
+
+    def test_get_price_cube_should_not_box_closes(self):
+        with mock.patch.object(Ohlc, '__init__', side_effect=AssertionError('boxed an Ohlc')):
+            cube = FREDDataProvider(client=self.client).get_price_cube()
+
+        np.testing.assert_array_equal(cube.open, cube.close)
+
+    def test_get_rates_should_box_closes_into_ohlc(self):
+        rates = FREDDataProvider(client=self.client).get_rates()
+        candle = rates['EURUSD'].iloc[0]
+
+        self.assertEqual(candle.open, candle.close)
+        self.assertAlmostEqual(self.client.values('FRED/DEXUSEU')[0], candle.close)
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lab.core.backtester import Backtester
+from lab.core.common import price_data_to_trade_lines
+from lab.core.fast_backtester import FastBacktester
+from lab.core.structures import InstructionBook, StopType, TradeInstruction
+from lab.test.helpers import IdleStrategy, random_rates, random_trade_details
+
+
+class InstructionBookTests(unittest.TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2016-01-01', periods=4)
+        self.price_df = pd.DataFrame({'EURUSD': [1.1, 1.2, 1.3, 1.4], 'USDJPY': [110., 111., 112., 113.]}, index=index)
+        self.risk_df = pd.DataFrame({'EURUSD': [0.0, 0.01, 0.0, np.nan], 'USDJPY': [-0.01, 0.0, 0.02, 0.01]},
+                                    index=index)
+        self.stop_df = pd.DataFrame({'EURUSD': [1.1, 1.19, 1.3, 1.4], 'USDJPY': [111., 111., np.nan, 112.]},
+                                    index=index)
+
+    def test_only_cells_with_risk_and_stop_should_be_events(self):
+        book = price_data_to_trade_lines(self.price_df, self.risk_df, self.stop_df)
+
+        self.assertEqual(3, len(book))
+        self.assertEqual([(0, 1), (1, 0), (3, 1)], list(zip(book.row, book.col)))
+        self.assertEqual(([0, 2], [1, 4]), tuple(list(a) for a in book.checks(0)))
+        self.assertEqual(([1], [2]), tuple(list(a) for a in book.checks(1)))
+        self.assertEqual([True, False, True, True], [book.is_checkable(i, 0) for i in range(4)])
+        self.assertEqual([False, True, False, False], [book.is_checkable(i, 1) for i in range(4)])
+
+    def test_on_should_give_the_instructions_of_a_date(self):
+        book = price_data_to_trade_lines(self.price_df, self.risk_df, self.stop_df)
+
+        instructions = book.on(pd.Timestamp('2016-01-02'))
+        self.assertEqual(1, len(instructions))
+        self.assertEqual(('EURUSD', 1.2, 1.19, 0.01, pd.Timestamp('2016-01-02'), StopType.Hard),
+                         (instructions[0].currency, instructions[0].price, instructions[0].stop, instructions[0].risk,
+                          instructions[0].trade_date, instructions[0].stop_type))
+        self.assertEqual([], book.on(pd.Timestamp('2016-01-03')))
+
+    def test_from_trade_details_should_round_trip_events(self):
+        book = price_data_to_trade_lines(self.price_df, self.risk_df, self.stop_df)
+        book.soft[0] = True
+        round_tripped = InstructionBook.from_trade_details(book.to_frame())
+
+        for name in ('row', 'col', 'price', 'stop', 'risk', 'soft'):
+            np.testing.assert_array_equal(getattr(book, name), getattr(round_tripped, name))
+        self.assertIs(StopType.Soft, round_tripped.instruction(0).stop_type)
+
+    def test_backtesters_should_agree_on_books(self):
+        for seed in range(3):
+            rates = random_rates(seed)
+            book = InstructionBook.from_trade_details(random_trade_details(rates, seed, density=0.6))
+            backtester, fast = Backtester(None, IdleStrategy()), FastBacktester(None, IdleStrategy())
+            expected, expected_trades = backtester.backtest(10000, book, rates, 0.5, Backtester.spread_map())
+            actual, actual_trades = fast.backtest(10000, book, rates, 0.5, Backtester.spread_map())
+
+            np.testing.assert_array_equal(expected.values, actual.values)
+            np.testing.assert_array_equal(backtester.open_risk.values, fast.open_risk.values)
+            self.assertEqual([t.pnl for t in expected_trades], [t.pnl for t in actual_trades])
+
+    def test_book_should_replay_like_the_grid_it_was_built_from(self):
+        # missing stops included, which book nothing either way
+        rates = random_rates(11)
+        for engine in (Backtester, FastBacktester):
+            expected, expected_trades = engine(None, IdleStrategy()).backtest(
+                10000, random_trade_details(rates, 11, density=0.6), rates, 0.5, Backtester.spread_map())
+            book = InstructionBook.from_trade_details(random_trade_details(rates, 11, density=0.6))
+            actual, actual_trades = engine(None, IdleStrategy()).backtest(10000, book, rates, 0.5,
+                                                                       Backtester.spread_map())
+            np.testing.assert_array_equal(expected.values, actual.values)
+            self.assertEqual([t.pnl for t in expected_trades], [t.pnl for t in actual_trades])
+
+    def test_instruction_without_stop_should_book_nothing(self):
+        rates = random_rates(5, bars=6, currencies=('EURUSD',))
+        details = pd.DataFrame(None, index=rates.index, columns=rates.columns, dtype=object)
+        opening = rates['EURUSD'].iloc[1].open
+        details.iat[1, 0] = TradeInstruction(opening, opening * 0.9, 0.01, 'EURUSD', rates.index[1])
+        details.iat[2, 0] = TradeInstruction(rates['EURUSD'].iloc[2].open, np.nan, 0.01, 'EURUSD', rates.index[2])
+
+        results, _ = Backtester(None, IdleStrategy()).backtest(10000, details, rates, 0.0, Backtester.spread_map())
+        self.assertNotEqual(0, results['EURUSD'].iloc[1])
+        self.assertEqual([0, 0, 0, 0], list(results['EURUSD'].iloc[2:]))
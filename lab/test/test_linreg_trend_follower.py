@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+import lab.test.helpers as hp
+from lab import Ohlc, PriceCube
+from lab.core.structures import Direction
+from lab.strategy.linreg_trend_follower import LineReg_Tf
+
+
+def create_trending_series(name, base, seed):
+    rng = np.random.RandomState(seed)
+    steps = rng.normal(0, 0.01, 300) + 0.003 * np.sin(np.arange(300) / 15.0)
+    closes = base * np.exp(np.cumsum(steps))
+    return hp.ohlc_series([Ohlc(c, c * 1.001, c * 0.999, c) for c in closes], name)
+
+
+def ols_instructions(strategy, rates_ser):
+    '''The per-bar statsmodels fit LineReg_Tf ran before the rolling kernel, as (date, price, stop, risk)'''
+    opens = np.array([x.open for x in rates_ser])
+    instructions = []
+    for i in range(strategy.lookback, len(opens) - strategy.lookback):
+        Y = opens[i - strategy.lookback:i]
+        X = range(len(Y))
+        (b, a) = sm.OLS(Y, sm.add_constant(X)).fit().params
+        slope = -(a / b) * strategy.lookback
+        delta = Y - (np.dot(a, X) + b)
+        sd = Y.std(ddof=1)
+        current_position = sum(x[3] for x in instructions)
+        new_weight, stop_price = np.nan, np.nan
+        if (current_position > 0 and slope < 0) or (current_position < 0 and 0 < slope):
+            new_weight = -current_position
+        if slope > 0.063:
+            if delta[-1] > 0 and delta[-2] < 0 and current_position == 0:
+                stop_price = strategy.stop_from_average(Y.mean(), Direction.Short)
+                new_weight = -slope / 10
+            if delta[-1] > 1.96 * sd and current_position > 0:
+                new_weight = -current_position
+        if slope < -0.063:
+            if delta[-1] < 0 and delta[-2] > 0 and current_position == 0:
+                stop_price = strategy.stop_from_average(Y.mean(), Direction.Long)
+                new_weight = -slope / 10
+            if delta[-1] < -1.96 * sd and current_position < 0:
+                new_weight = -current_position
+        if not np.isnan(new_weight):
+            instructions.append((rates_ser.index[i], opens[i], stop_price, new_weight))
+    return instructions
+
+
+def risks(instruction_ser):
+    return [x.risk for x in instruction_ser.dropna()]
+
+
+class LineRegTrendFollowerTests(unittest.TestCase):
+
+    def test_run_should_generate_each_pair_independently(self):
+        eurusd = create_trending_series('EURUSD', 1.2, 3)
+        usdjpy = create_trending_series('USDJPY', 110, 4)
+        rates = pd.concat([eurusd, usdjpy], axis=1, keys=['EURUSD', 'USDJPY'])
+        sut = LineReg_Tf(lookback=21)
+        instructions = sut.run(rates)
+        self.assertTrue(risks(instructions['EURUSD']))
+        self.assertEqual(risks(sut.get_regressions(eurusd)), risks(instructions['EURUSD']))
+        self.assertEqual(risks(sut.get_regressions(usdjpy)), risks(instructions['USDJPY']))
+
+    def test_exit_instructions_should_flatten_running_position(self):
+        instructions = LineReg_Tf(lookback=21).get_regressions(create_trending_series('EURUSD', 1.2, 3))
+        position = 0.0
+        for instruction in instructions.dropna():
+            if np.isnan(instruction.stop):
+                self.assertEqual(-position, instruction.risk)
+            else:
+                self.assertEqual(0.0, position)
+            position += instruction.risk
+
+    def test_run_on_price_cube_should_match_ohlc_frame(self):
+        rates = pd.concat([create_trending_series('EURUSD', 1.2, 3)], axis=1, keys=['EURUSD'])
+        sut = LineReg_Tf(lookback=21)
+        self.assertEqual(risks(sut.run(rates)['EURUSD']), risks(sut.run(PriceCube.from_ohlc_frame(rates))['EURUSD']))
+
+    def test_instructions_should_match_per_bar_ols(self):
+        for seed in range(3, 8):
+            rates_ser = create_trending_series('EURUSD', 1.2, seed)
+            sut = LineReg_Tf(lookback=21)
+            expected = ols_instructions(sut, rates_ser)
+            actual = [(x.trade_date, x.price, x.stop, x.risk) for x in sut.get_regressions(rates_ser).dropna()]
+            self.assertTrue(expected)
+            self.assertEqual([e[0] for e in expected], [a[0] for a in actual])
+            np.testing.assert_allclose([e[1:] for e in expected], [a[1:] for a in actual], rtol=1e-9)
+
+    def test_regression_on_a_window_should_match_get_regressions(self):
+        rates_ser = create_trending_series('EURUSD', 1.2, 3)
+        sut = LineReg_Tf(lookback=21)
+        instructions = sut.get_regressions(rates_ser)
+        for i in instructions.dropna().index:
+            k = rates_ser.index.get_loc(i)
+            new_weight, stop = sut.regression(rates_ser.iloc[k - 21:k], instructions.iloc[:k])[:2]
+            self.assertAlmostEqual(instructions[i].risk, new_weight, places=12)
+            np.testing.assert_allclose(instructions[i].stop, stop, rtol=1e-12)
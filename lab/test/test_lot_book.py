@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from lab.core.lot_book import LotBook
+from lab.core.structures import Direction
+
+
+class StubLot:
+    def __init__(self, risk):
+        self.risk = risk
+        self.direction = Direction.Long if risk > 0 else Direction.Short
+        self.closes = []
+
+    def close_transaction(self, price, risk_to_close=np.nan, date=None):
+        risk_to_close = -self.risk if np.isnan(risk_to_close) else risk_to_close
+        self.closes.append((price, risk_to_close))
+        self.risk += risk_to_close
+        return price
+
+
+class LotBookTests(unittest.TestCase):
+
+    def setUp(self):
+        self.book = LotBook()
+        self.lots = [StubLot(0.01), StubLot(0.02), StubLot(0.03)]
+        for lot in self.lots:
+            self.book.append(lot)
+
+    def test_net_risk_and_direction_should_follow_appends(self):
+        self.assertAlmostEqual(0.06, self.book.net_risk)
+        self.assertIs(Direction.Long, self.book.direction)
+        self.assertEqual(3, len(self.book))
+
+    def test_close_front_should_close_whole_oldest_lot_and_return_residual(self):
+        pnl, residual, closed = self.book.close_front(1.5, -0.015)
+        self.assertIs(self.lots[0], closed)
+        self.assertAlmostEqual(-0.005, residual)
+        self.assertIs(self.lots[1], self.book[0])
+        self.assertAlmostEqual(0.05, self.book.net_risk)
+
+    def test_close_front_should_partially_close_oldest_lot(self):
+        pnl, residual, closed = self.book.close_front(1.5, -0.004)
+        self.assertIsNone(closed)
+        self.assertEqual(0, residual)
+        self.assertAlmostEqual(0.006, self.book[0].risk)
+        self.assertAlmostEqual(0.056, self.book.net_risk)
+
+    def test_close_where_should_close_matching_lots_anywhere_in_book(self):
+        pnl, closed = self.book.close_where(lambda lot: 1.4 if lot.risk < 0.025 else None)
+        self.assertEqual(self.lots[:2], closed)
+        self.assertEqual(self.lots[2:], list(self.book))
+        self.assertAlmostEqual(2.8, pnl)
+        self.assertAlmostEqual(0.03, self.book.net_risk)
+
+    def test_emptied_book_should_hold_no_risk_or_direction(self):
+        self.book.close_where(lambda lot: 1.4)
+        self.assertEqual(0, self.book.net_risk)
+        self.assertIsNone(self.book.direction)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import datetime as dt
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from lab.core.structures import Ohlc
+from lab.data.oanda_dataprovider import OandaDataProvider
+from lab.test.oanda_stub import StubOandaServer
+
+
+class OandaDataProviderTests(unittest.TestCase):
+
+    def provider(self, server, **kwargs):
+        return OandaDataProvider(dt.datetime(2016, 1, 1), dt.datetime(2016, 1, 31), 'D',
+                                 base_url=server.base_url, **kwargs)
+
+    def test_get_price_cube_should_fetch_every_instrument_concurrently(self):
+        with StubOandaServer(delay=0.2) as server:
+            cube = self.provider(server, use_exotics=True, max_workers=17).get_price_cube()
+
+        self.assertEqual(17, len(server.requests))
+        self.assertGreater(server.max_in_flight, 1)
+        self.assertEqual(OandaDataProvider.majors() + OandaDataProvider.exotics(), list(cube.columns))
+        self.assertEqual(31, len(cube))
+
+    def test_get_price_cube_should_align_pairs_to_first_and_fill_gaps(self):
+        missing = {'AUDUSD': [dt.datetime(2016, 1, 5)], 'EURUSD': [dt.datetime(2016, 1, 10)]}
+        with StubOandaServer(missing=missing) as server:
+            cube = self.provider(server, max_workers=3).get_price_cube()
+
+        self.assertEqual(30, len(cube))
+        self.assertNotIn(np.datetime64('2016-01-10'), cube.index.values)
+        aud = cube.pair('AUDUSD')
+        self.assertFalse(np.isnan(cube.close).any())
+        self.assertEqual(aud['close'].loc['2016-01-04'], aud['close'].loc['2016-01-05'])
+
+    def test_get_price_cube_should_not_box_candles(self):
+        with StubOandaServer() as server, \
+                mock.patch.object(Ohlc, '__init__', side_effect=AssertionError('boxed an Ohlc')):
+            cube = self.provider(server).get_price_cube()
+
+        self.assertEqual(OandaDataProvider.majors(), list(cube.columns))
+
+    def test_get_rates_should_return_ohlc_frame_of_majors(self):
+        with StubOandaServer() as server:
+            rates = self.provider(server).get_rates()
+
+        self.assertEqual(OandaDataProvider.majors(), list(rates.columns))
+        candle = rates['EURUSD'].iloc[0]
+        self.assertAlmostEqual(1.001, candle.open)
+        self.assertAlmostEqual(1.006, candle.close)
+        self.assertEqual(1, candle.volume)
+
+    def test_requested_price_component_should_be_decoded(self):
+        with StubOandaServer() as server:
+            provider = self.provider(server, price_component='Ask')
+            candles = provider.get_candles('EURUSD', provider.from_date, provider.to_date, 'D')
+
+        self.assertEqual('bidask', server.requests[0]['candleFormat'])
+        self.assertAlmostEqual(1.0011, candles['open'].iloc[0])
+        self.assertAlmostEqual(1.0061, candles['close'].iloc[0])
+
+    def test_cached_range_ending_without_candles_should_not_be_fetched_again(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with StubOandaServer(missing={'EURUSD': [dt.datetime(2016, 1, 30), dt.datetime(2016, 1, 31)]}) as server:
+                provider = self.provider(server, cache_dir=cache_dir)
+                for _ in range(4):
+                    candles = provider.get_candles('EURUSD', provider.from_date, provider.to_date, 'D')
+        finally:
+            shutil.rmtree(cache_dir)
+
+        self.assertEqual(1, len(server.requests))
+        self.assertEqual(29, len(candles))
+
+    def test_long_range_should_be_fetched_in_chunks_without_duplicates(self):
+        with StubOandaServer(delay=0.05, limit=8) as server:
+            provider = self.provider(server, max_candles=7)
+            candles = provider.get_candles('EURUSD', provider.from_date, provider.to_date, 'D')
+
+        self.assertEqual(5, len(server.requests))
+        self.assertGreater(server.max_in_flight, 1)
+        self.assertEqual(31, len(candles))
+        self.assertTrue(candles.index.is_unique and candles.index.is_monotonic_increasing)
+        np.testing.assert_array_equal(np.arange(1, 32), [c.day for c in candles.index])
+
+    def test_single_request_should_be_truncated_by_server_limit(self):
+        with StubOandaServer(limit=8) as server:
+            provider = self.provider(server)
+            candles = provider.get_candles('EURUSD', provider.from_date, provider.to_date, 'D')
+
+        self.assertEqual(1, len(server.requests))
+        self.assertEqual(8, len(candles))
+
+    def test_chunk_ranges_should_cover_range_with_shared_boundaries(self):
+        provider = OandaDataProvider(None, None, 'M1', max_candles=60)
+        chunks = provider.chunk_ranges(dt.datetime(2016, 1, 1), dt.datetime(2016, 1, 1, 2, 30), 'M1')
+        self.assertEqual([(dt.datetime(2016, 1, 1, 0), dt.datetime(2016, 1, 1, 1)),
+                          (dt.datetime(2016, 1, 1, 1), dt.datetime(2016, 1, 1, 2)),
+                          (dt.datetime(2016, 1, 1, 2), dt.datetime(2016, 1, 1, 2, 30))], chunks)
+
+    def test_decode_candles_should_match_parse_candle(self):
+        server = StubOandaServer()
+        candles = server.candles('EURUSD', pd.Timestamp(2016, 1, 1), pd.Timestamp(2016, 1, 5))
+        server.server_close()
+        columns = OandaDataProvider.decode_candles(candles)
+        rates = [OandaDataProvider.parse_candle(c) for c in candles]
+
+        self.assertEqual(np.dtype('datetime64[ns]'), columns['time'].dtype)
+        np.testing.assert_array_equal(np.array([r.date for r in rates], dtype='datetime64[ns]'), columns['time'])
+        for name in ('open', 'high', 'low', 'close', 'volume'):
+            np.testing.assert_array_equal([getattr(r, name) for r in rates], columns[name])
+        np.testing.assert_array_equal([c['complete'] for c in candles], columns['complete'])
@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+from lab.core.backtester import Backtester
+from lab.core.structures import InstructionBook, InitError
+import lab.test.helpers as hp
+from lab.test.helpers import IdleStrategy
+
+
+class ParallelBacktestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = hp.random_rates(11, bars=200)
+
+    def details(self):
+        return hp.random_trade_details(self.rates, 11, density=0.5)
+
+    def test_rebalancing_every_bar_should_match_backtest(self):
+        backtester = Backtester(None, IdleStrategy())
+        expected, expected_trades = backtester.backtest(10000, self.details(), self.rates, 0.5,
+                                                        Backtester.spread_map())
+        expected_risk = backtester.open_risk
+        actual, actual_trades = backtester.parallel_backtest(10000, self.details(), self.rates, 0.5,
+                                                             Backtester.spread_map(), rebalance=1, max_workers=2)
+
+        np.testing.assert_array_equal(expected.values, actual.values)
+        np.testing.assert_array_equal(expected_risk.values, backtester.open_risk.values)
+        self.assertEqual([(t.pnl, t.from_date, t.to_date) for t in expected_trades],
+                         [(t.pnl, t.from_date, t.to_date) for t in actual_trades])
+        self.assertGreater(len(actual_trades), 0)
+
+    def test_instruction_book_rebalanced_every_bar_should_match_backtest(self):
+        backtester = Backtester(None, IdleStrategy())
+        expected, _ = backtester.backtest(10000, InstructionBook.from_trade_details(self.details()), self.rates)
+        actual, _ = backtester.parallel_backtest(10000, InstructionBook.from_trade_details(self.details()),
+                                                 self.rates, rebalance=1, max_workers=2)
+        np.testing.assert_array_equal(expected.values, actual.values)
+
+    def test_rebalancing_every_few_bars_should_match_backtest(self):
+        backtester = Backtester(None, IdleStrategy())
+        for rebalance in (None, 7):
+            expected, expected_trades = backtester.backtest(10000, self.details(), self.rates, 0.5,
+                                                            Backtester.spread_map(), rebalance=rebalance)
+            expected_risk = backtester.open_risk
+            actual, actual_trades = backtester.parallel_backtest(10000, self.details(), self.rates, 0.5,
+                                                                 Backtester.spread_map(), rebalance=rebalance,
+                                                                 max_workers=2)
+
+            np.testing.assert_array_equal(expected.values, actual.values)
+            np.testing.assert_array_equal(expected_risk.values, backtester.open_risk.values)
+            self.assertEqual([(t.pnl, t.from_date, t.to_date) for t in expected_trades],
+                             [(t.pnl, t.from_date, t.to_date) for t in actual_trades])
+
+    def test_rebalancing_should_size_trades_on_the_equity_at_the_start_of_the_block(self):
+        backtester = Backtester(None, IdleStrategy())
+        every_bar, _ = backtester.backtest(10000, self.details(), self.rates, 0.5, Backtester.spread_map())
+        fixed, _ = backtester.backtest(10000, self.details(), self.rates, 0.5, Backtester.spread_map(),
+                                       rebalance=None)
+        coarse, _ = backtester.backtest(10000, self.details(), self.rates, 0.5, Backtester.spread_map(),
+                                        rebalance=len(self.rates))
+
+        np.testing.assert_array_equal(fixed.values, coarse.values)
+        self.assertFalse(np.array_equal(every_bar.values, fixed.values))
+
+    def test_worker_errors_should_be_raised(self):
+        details = hp.create_trade_details(self.rates, {(3, 'GBPUSD'): (0.01, -200)})
+        self.assertRaises(InitError, Backtester(None, IdleStrategy()).parallel_backtest, 10000, details,
+                          self.rates, rebalance=5, max_workers=2)
+
+    def test_fixed_capital_should_size_each_pair_independently(self):
+        backtester = Backtester(None, IdleStrategy())
+        results, _ = backtester.parallel_backtest(10000, self.details(), self.rates, max_workers=2)
+        alone, _ = backtester.parallel_backtest(10000, self.details()[['USDJPY']], self.rates[['USDJPY']],
+                                                max_workers=1)
+
+        np.testing.assert_array_equal(alone['USDJPY'].values, results['USDJPY'].values)
+        np.testing.assert_allclose(10000 + results[['EURUSD', 'USDJPY', 'GBPUSD']].sum(axis=1).cumsum().values,
+                                   results['PnL'].values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import datetime as dt
+import unittest
+
+import numpy as np
+
+from lab.core.pnl_history import PnlHistory
+
+
+class PnlHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.history = PnlHistory()
+        self.history.append(-4.0, dt.date(2016, 1, 1))
+        self.history.skip()
+        self.history.append(0, dt.date(2016, 1, 3))
+        self.history.append(10.5, dt.date(2016, 1, 4))
+        self.history.skip()
+
+    def test_should_read_like_the_dense_list(self):
+        dense = [-4.0, 0, 0, 10.5, 0]
+        self.assertEqual(len(dense), len(self.history))
+        self.assertEqual(dense, [self.history[k] for k in range(len(dense))])
+        self.assertEqual(dense, list(self.history))
+        self.assertEqual(0, self.history[-1])
+        self.assertEqual(10.5, self.history[-2])
+        self.assertEqual(sum(dense), sum(self.history))
+
+    def test_only_non_zero_amounts_should_be_stored(self):
+        self.assertEqual([-4.0, 10.5], self.history.amounts)
+        self.assertEqual([0, 3], self.history.positions)
+
+    def test_total_should_be_kept_running(self):
+        self.assertEqual(6.5, self.history.total)
+
+    def test_views_should_be_materialized_on_demand(self):
+        np.testing.assert_array_equal([-4.0, 0, 0, 10.5, 0], self.history.dense())
+        series = self.history.to_series()
+        self.assertEqual([dt.date(2016, 1, 1), dt.date(2016, 1, 4)], list(series.index))
+
+    def test_out_of_range_should_throw(self):
+        with self.assertRaises(IndexError):
+            self.history[5]
+        with self.assertRaises(IndexError):
+            PnlHistory()[-1]
+
+
+if __name__ == '__main__':
+    unittest.main()
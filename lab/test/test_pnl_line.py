@@ -163,3 +163,55 @@ class PnlLineUnitTests(unittest.TestCase):
         self.assertEqual(0.2, result.returns)
         self.assertEqual(0.2, result2.returns)
 
+
+    def test_records_should_be_slotted(self):
+        t = TradeInstruction(currency="EURUSD", price=1.1000, stop=1.0090, risk=0.01, trade_date=dt.date(2014, 10, 10))
+        line = PnlLine(opening_trade=t, pnl=1000)
+        for record in (t, line):
+            self.assertFalse(hasattr(record, '__dict__'))
+            self.assertRaises(AttributeError, setattr, record, 'unknown', 1)
+        self.assertEqual('p=1.1, s=1.009, r=0.01', repr(t))
+
+    def create_lines(self):
+        lines = []
+        for k, (days, length, pnl, exit_type) in enumerate([(5, 10, 100, ExitType.Closed), (0, 30, -50, ExitType.Closed),
+                                                            (12, 3, 25, ExitType.Stopped), (2, 40, 10, ExitType.Closed)]):
+            t = TradeInstruction(currency="EURUSD", price=1.1 + k / 100, stop=1.0, risk=0.01,
+                                 trade_date=dt.date(2014, 10, 1) + dt.timedelta(days=days))
+            line = PnlLine(opening_trade=t, close_price=1.2 + k / 100, pnl=pnl, initial_capital=1000.0 * (k + 1),
+                           to_date=t.trade_date + dt.timedelta(days=length))
+            line.exit_type = exit_type
+            lines.append(line)
+        return lines
+
+    def test_sum_pnl_lines_should_match_adding_them_up(self):
+        lines = self.create_lines()
+        added = lines[0] + lines[1] + lines[2] + lines[3]
+        result = PnlLine.sum(lines)
+        for field in ('from_date', 'to_date', 'open_price', 'close_price', 'initial_capital', 'pnl', 'returns',
+                      'exit_type', 'details'):
+            self.assertEqual(getattr(added, field), getattr(result, field))
+
+    def test_sum_pnl_lines_should_keep_the_details_of_the_lines_until_read(self):
+        lines = self.create_lines()
+        partial = PnlLine.sum(lines[:2])
+        result = PnlLine.sum([partial] + lines[2:])
+        lines[3].details.append(lines[0].details[0])
+
+        self.assertEqual([l.details[0] for l in lines] + [lines[0].details[0]], result.details)
+        self.assertIs(result.details, result.details)
+
+    def test_sum_pnl_lines_should_throw_if_currencies_are_different(self):
+        lines = self.create_lines()
+        lines.append(PnlLine(TradeInstruction(currency="USDJPY", price=110, stop=100, risk=0.01,
+                                              trade_date=dt.date(2014, 10, 10)), pnl=10))
+        with self.assertRaises(LookupError):
+            PnlLine.sum(lines)
+
+    def test_to_frame_should_give_one_row_per_line(self):
+        lines = self.create_lines()
+        frame = PnlLine.to_frame(lines + [None])
+        self.assertEqual(4, len(frame))
+        self.assertEqual([100, -50, 25, 10], list(frame.pnl))
+        self.assertEqual(['Closed', 'Closed', 'Stopped', 'Closed'], list(frame.exit_type))
+        self.assertEqual(lines[2].to_date, frame.to_date[2])
@@ -277,3 +277,26 @@ class PositionUnitTests(unittest.TestCase):
 
 
 
+
+    def test_stop_outs_should_close_every_breached_line(self):
+        position = Position(self.create_trade_line(price=1.5, stop=1.4950, risk=0.01), 10000)
+        for stop in (1.4960, 1.4970):
+            instruction = self.create_trade_line(price=1.5, stop=stop, risk=0.01)
+            position.revalue_position(instruction, ohcl(1.5, 1.5, 1.5, 1.5), 10000)
+        check = self.create_trade_line(price=1.4958, stop=1.4958, risk=0)
+        position.revalue_position(check, ohcl(1.4958, 1.4958, 1.4958, 1.4958), 10000)
+        self.assertEqual([1.4950], [l.trade_details.stop for l in position.lines])
+        self.assertAlmostEqual(0.01, position.net_risk)
+        self.assertEqual(2, len(position.transaction_pnls))
+
+    def test_revalue_position_should_net_off_oldest_lines_first(self):
+        position = Position(self.create_trade_line(price=1.5, stop=1.5050, risk=-0.01), 10000)
+        for price in (1.4990, 1.4980):
+            instruction = self.create_trade_line(price=price, stop=1.5050, risk=-0.01)
+            position.revalue_position(instruction, ohcl(price, price, price, price), 10000)
+        instruction = self.create_trade_line(price=1.4970, stop=1.4900, risk=0.015)
+        position.revalue_position(instruction, ohcl(1.497, 1.497, 1.497, 1.497), 10000)
+        self.assertEqual([1.4990, 1.4980], [l.trade_details.price for l in position.lines])
+        self.assertAlmostEqual(-0.005, position.lines[0].risk)
+        self.assertAlmostEqual(-0.015, position.net_risk)
+        self.assertEqual(1, len(position.transaction_pnls))
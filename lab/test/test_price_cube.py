@@ -0,0 +1,103 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import lab.test.helpers as hp
+from lab import Ohlc
+from lab.core.common import get_range
+from lab.core.price_cube import PriceCube, PriceCursor, ohlc_field, as_price_cube
+
+
+def create_ohlc_frame():
+    gbpusd = hp.ohlc_series([Ohlc(1.0, 1.0010, 0.9979, 0.9980),
+                             Ohlc(0.9980, 0.9994, 0.9950, 0.9962),
+                             Ohlc(0.9952, 0.9982, 0.9948, 0.9970)], 'GBPUSD')
+    usdjpy = hp.ohlc_series([Ohlc(110.0, 110.5, 109.5, 110.2),
+                             Ohlc(110.2, 111.0, 110.0, 110.9),
+                             Ohlc(110.9, 111.2, 110.1, 110.3)], 'USDJPY')
+    return pd.concat([gbpusd, usdjpy], axis=1, keys=['GBPUSD', 'USDJPY'])
+
+
+class PriceCubeTests(unittest.TestCase):
+
+    def test_from_ohlc_frame_should_store_fields_as_float_arrays(self):
+        cube = PriceCube.from_ohlc_frame(create_ohlc_frame())
+        self.assertEqual((3, 2), cube.shape)
+        self.assertEqual(np.float64, cube.open.dtype)
+        self.assertAlmostEqual(111.0, cube.high[1, 1])
+        self.assertAlmostEqual(0.9948, cube.low[2, 0])
+
+    def test_field_should_match_unboxed_ohlc_frame(self):
+        ohlc_df = create_ohlc_frame()
+        cube = PriceCube.from_ohlc_frame(ohlc_df)
+        expected = pd.DataFrame([[x.open for x in row] for row in ohlc_df.values], index=ohlc_df.index,
+                                columns=ohlc_df.columns)
+        pd.testing.assert_frame_equal(expected, cube.field('open'), check_dtype=False)
+        pd.testing.assert_frame_equal(expected, ohlc_field(cube, 'open'), check_dtype=False)
+
+    def test_ohlc_adapter_should_round_trip(self):
+        ohlc_df = create_ohlc_frame()
+        round_trip = PriceCube.from_ohlc_frame(ohlc_df).to_ohlc_frame()
+        self.assertEqual(list(ohlc_df.columns), list(round_trip.columns))
+        self.assertEqual(ohlc_df.iloc[1, 1].close, round_trip.iloc[1, 1].close)
+        self.assertEqual(ohlc_df.index[1], round_trip.iloc[1, 1].date)
+
+    def test_from_close_should_set_all_price_fields_to_close(self):
+        close_df = pd.DataFrame({'EURUSD': [1.1, 1.2]}, index=hp.date_range(2))
+        cube = PriceCube.from_close(close_df)
+        self.assertEqual(1.2, cube.ohlc(1, 0).open)
+        self.assertEqual(1.2, cube.ohlc(1, 0).low)
+
+    def test_from_pair_frames_should_align_to_first_pair_and_fill(self):
+        dates = hp.date_range(3)
+        eurusd = pd.DataFrame({'open': [1, 2, 3], 'high': [1, 2, 3], 'low': [1, 2, 3], 'close': [1, 2, 3]},
+                              index=dates)
+        gbpusd = pd.DataFrame({'open': [5.0], 'high': [5.0], 'low': [5.0], 'close': [5.0]}, index=dates[1:2])
+        cube = PriceCube.from_pair_frames({'EURUSD': eurusd, 'GBPUSD': gbpusd}).fill()
+        np.testing.assert_array_equal([5, 5, 5], cube.close[:, 1])
+
+    def test_take_with_slice_should_be_a_view(self):
+        cube = PriceCube.from_ohlc_frame(create_ohlc_frame())
+        head = cube.take(slice(0, 2))
+        self.assertEqual(2, len(head))
+        self.assertTrue(np.shares_memory(head.open, cube.open))
+
+    def test_get_range_should_select_cube_rows(self):
+        cube = as_price_cube(create_ohlc_frame())
+        ranged = get_range(cube, '2016-10-21', '2016-10-22')
+        self.assertEqual(2, len(ranged))
+        self.assertAlmostEqual(0.9980, ranged.open[0, 0])
+
+
+class PriceCursorTests(unittest.TestCase):
+
+    def test_window_should_expose_history_up_to_current_bar(self):
+        cursor = PriceCursor(PriceCube.from_ohlc_frame(create_ohlc_frame())).move_to(1)
+        window = cursor['USDJPY']
+        self.assertEqual('USDJPY', window.name)
+        self.assertEqual(2, len(window))
+        self.assertEqual(110.9, window[-1].close)
+        self.assertEqual(window.index[-1], window[-1].date)
+
+    def test_window_fields_should_be_views_over_the_cube(self):
+        cube = PriceCube.from_ohlc_frame(create_ohlc_frame())
+        window = PriceCursor(cube).move_to(2)['GBPUSD']
+        self.assertTrue(np.shares_memory(cube.open, window.values('open')))
+        self.assertEqual([1.0, 0.9980, 0.9952], list(ohlc_field(window, 'open')))
+
+    def test_window_apply_should_match_ohlc_series_apply(self):
+        ohlc_df = create_ohlc_frame()
+        window = PriceCursor(as_price_cube(ohlc_df)).move_to(2)['GBPUSD']
+        pd.testing.assert_series_equal(ohlc_df['GBPUSD'].apply(lambda x: x.high), window.apply(lambda x: x.high))
+
+    def test_window_slice_should_stay_a_window(self):
+        window = PriceCursor(as_price_cube(create_ohlc_frame())).move_to(2)['GBPUSD']
+        self.assertEqual(0.9980, window[1:][0].open)
+        self.assertEqual(2, len(window[:2]))
+
+    def test_lookback_should_bound_window_length(self):
+        cursor = PriceCursor(as_price_cube(create_ohlc_frame()), lookback=2).move_to(2)
+        window = cursor['GBPUSD']
+        self.assertEqual(2, len(window))
+        self.assertEqual(0.9980, window[0].open)
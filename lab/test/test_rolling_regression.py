@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+import lab.test.helpers as hp
+from lab import Ohlc
+from lab.indicators.regression import RollingRegression, rolling_regression
+
+
+class RollingRegressionTests(unittest.TestCase):
+
+    def test_window_fit_should_match_least_squares_fit(self):
+        prices = 1.1 + np.cumsum(np.random.RandomState(3).normal(0, 0.001, (60, 2)), axis=0)
+        stats = rolling_regression(prices, 10)
+        for t in [9, 31, 59]:
+            window = prices[t - 9:t + 1, 1]
+            a, b = np.polyfit(np.arange(10), window, 1)
+            delta = window - (a * np.arange(10) + b)
+            self.assertAlmostEqual(a, stats['slope'][t, 1], places=10)
+            self.assertAlmostEqual(b, stats['intercept'][t, 1], places=10)
+            self.assertAlmostEqual(delta[-1], stats['residual'][t, 1], places=10)
+            self.assertAlmostEqual(delta[-2], stats['prev_residual'][t, 1], places=10)
+            self.assertAlmostEqual(window.std(ddof=1), stats['std'][t, 1], places=10)
+
+    def test_long_windows_at_a_large_price_level_should_match_statsmodels(self):
+        # running sums over long windows of large prices are where cancellation would show
+        prices = 25000 + np.cumsum(np.random.RandomState(11).normal(0, 20, (3000, 2)), axis=0)
+        periods = 750
+        stats = rolling_regression(prices, periods)
+        A = sm.add_constant(np.arange(periods, dtype=np.float64))
+        for t in [periods - 1, 1234, 2999]:
+            for j in range(2):
+                window = prices[t - periods + 1:t + 1, j]
+                fit = sm.OLS(window, A).fit()
+                np.testing.assert_allclose([fit.params[1], fit.params[0], fit.resid[-1], fit.resid[-2],
+                                            window.std(ddof=1)],
+                                           [stats['slope'][t, j], stats['intercept'][t, j], stats['residual'][t, j],
+                                            stats['prev_residual'][t, j], stats['std'][t, j]], rtol=1e-9, atol=1e-8)
+
+    def test_blocks_should_not_change_the_fit(self):
+        prices = 1.1 + np.cumsum(np.random.RandomState(5).normal(0, 0.001, (200, 1)), axis=0)
+        np.testing.assert_almost_equal(rolling_regression(prices, 7)['slope'],
+                                       rolling_regression(prices, 7, block=16)['slope'], decimal=12)
+
+    def test_windows_before_lookback_or_containing_nan_should_be_nan(self):
+        prices = np.arange(12, dtype=np.float64)
+        prices[8] = np.nan
+        slope = rolling_regression(prices, 3)['slope'][:, 0]
+        self.assertTrue(np.isnan(slope[:2]).all())
+        self.assertAlmostEqual(1.0, slope[7])
+        self.assertTrue(np.isnan(slope[8:11]).all())
+        self.assertAlmostEqual(1.0, slope[11])
+
+    def test_calculate_all_should_match_per_series_calculation(self):
+        eurusd = hp.ohlc_series([Ohlc(o, o, o, o) for o in [1.10, 1.12, 1.11, 1.15, 1.14, 1.13, 1.18]], 'EURUSD')
+        usdjpy = hp.ohlc_series([Ohlc(o, o, o, o) for o in [110, 111, 109, 108, 112, 113, 111]], 'USDJPY')
+        rates = pd.concat([eurusd, usdjpy], axis=1, keys=['EURUSD', 'USDJPY'])
+        sut = RollingRegression(periods=4)
+        all_df = sut.calculate_all(rates)
+        np.testing.assert_almost_equal(sut.calculate_dataframe(usdjpy)['slope'].values,
+                                       all_df['slope']['USDJPY'].values)
+        self.assertAlmostEqual(sut.calculate(eurusd), all_df['slope']['EURUSD'].iloc[-1])
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from lab.core.stops import first_breach
+from lab.core.structures import StopType
+
+
+class FirstBreachTests(unittest.TestCase):
+
+    def setUp(self):
+        self.low = np.array([1.00, 0.99, 0.985, 0.97, 0.99, 0.95])
+        self.high = self.low + 0.02
+
+    def test_long_stop_should_be_hit_by_first_low_at_or_below_it(self):
+        self.assertEqual(3, first_breach(self.high, self.low, 0.975, long=True))
+
+    def test_short_stop_should_be_hit_by_first_high_at_or_above_it(self):
+        self.assertEqual(1, first_breach(self.high, self.low, 1.01, long=False, start=1))
+
+    def test_spread_should_widen_the_candle(self):
+        self.assertEqual(2, first_breach(self.high, self.low, 0.975, long=True, spread=0.01))
+
+    def test_search_should_start_at_start(self):
+        self.assertEqual(5, first_breach(self.high, self.low, 0.975, long=True, start=4))
+
+    def test_only_checkable_bars_should_be_searched(self):
+        checkable = np.array([True, True, True, False, True, True])
+        self.assertEqual(5, first_breach(self.high, self.low, 0.975, long=True, checkable=checkable))
+
+    def test_soft_stop_should_never_be_hit(self):
+        self.assertIsNone(first_breach(self.high, self.low, 0.975, long=True, stop_type=StopType.Soft))
+
+    def test_stop_never_reached_should_give_none(self):
+        self.assertIsNone(first_breach(self.high, self.low, 0.9, long=True))
+
+    def test_breach_beyond_first_block_should_be_found(self):
+        low = np.ones(1000)
+        low[777] = 0.5
+        self.assertEqual(777, first_breach(low + 0.01, low, 0.6, long=True, start=3, block=4))
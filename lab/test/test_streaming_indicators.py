@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import lab.test.helpers as hp
+from lab import Ohlc
+from lab.indicators.ema import EMA
+from lab.indicators.indicator import ATR
+from lab.indicators.rolling import RollingMean, RollingStd, RollingMin, RollingMax
+
+
+def create_random_series(numdays=120, seed=7):
+    rng = np.random.RandomState(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.005, numdays))
+    open = close + rng.normal(0, 0.002, numdays)
+    high = np.maximum(open, close) + np.abs(rng.normal(0, 0.002, numdays))
+    low = np.minimum(open, close) - np.abs(rng.normal(0, 0.002, numdays))
+    return hp.ohlc_series([Ohlc(o, h, l, c) for o, h, l, c in zip(open, high, low, close)])
+
+
+class StreamingIndicatorTests(unittest.TestCase):
+
+    def assert_streaming_matches_batch(self, sut, batch_column):
+        ser = create_random_series()
+        expected = sut.calculate_dataframe(ser)[batch_column].values
+        sut.reset()
+        actual = [sut.update(candle) for candle in ser]
+        np.testing.assert_almost_equal(expected, actual, decimal=12)
+
+    def test_atr_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(ATR(periods=14), 'atr')
+
+    def test_ema_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(EMA(periods=10), 'ema')
+
+    def test_rolling_mean_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(RollingMean(periods=20), 'mean')
+
+    def test_rolling_std_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(RollingStd(periods=20, field='open'), 'std')
+
+    def test_rolling_min_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(RollingMin(periods=5, field='low'), 'min')
+
+    def test_rolling_max_update_should_match_batch_bar_for_bar(self):
+        self.assert_streaming_matches_batch(RollingMax(periods=5, field='high'), 'max')
+
+    def test_rolling_window_with_nan_should_be_nan_until_it_leaves_the_window(self):
+        sut = RollingMean(periods=2)
+        values = [sut.update(Ohlc(x, x, x, x)) for x in [1.0, np.nan, 3.0, 5.0]]
+        self.assertTrue(np.isnan(values[1]) and np.isnan(values[2]))
+        self.assertAlmostEqual(4.0, values[3])
+
+    def test_restore_should_rewind_to_snapshot(self):
+        ser = create_random_series()
+        sut = ATR(periods=5)
+        for candle in ser[:50]:
+            sut.update(candle)
+        state = sut.snapshot()
+        expected = [sut.update(candle) for candle in ser[50:]]
+        sut.restore(state)
+        actual = [sut.update(candle) for candle in ser[50:]]
+        self.assertEqual(expected, actual)
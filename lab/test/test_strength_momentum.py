@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lab.core.price_cube import PriceCube
+from lab.strategy.strength_momentum import StrengthMomentum, calc_real_risk, calc_expected_prc_pos, \
+    calc_expected_prc_pos_df, convert_to_natural_pair_df, get_relative_returns
+
+
+def rolling_risk_by_row(price_df, theoretical_r_df, max_r):
+    risk = theoretical_r_df.values.copy()
+    prices = price_df.values
+    for j in range(risk.shape[1]):
+        for x in range(1, len(risk)):
+            risk[x, j] = calc_real_risk(prices[x, j], prices[x - 1, j], risk[x - 1, j], risk[x, j], max_r)
+    return risk
+
+
+class CalcRollingRiskTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        index = pd.date_range('2001-01-01', periods=400)
+        columns = ['EURUSD', 'USDJPY', 'GBPUSD']
+        self.prices = pd.DataFrame(100 + np.cumsum(rng.normal(size=(400, 3)), axis=0), index=index, columns=columns)
+        self.prices.iloc[[10, 50, 51], [0, 1, 2]] = np.nan
+        self.expected = pd.DataFrame(rng.choice([0.0, 0.01, -0.01, 0.005, -0.0025], size=(400, 3)),
+                                     index=index, columns=columns)
+
+    def test_should_match_calc_real_risk_row_by_row(self):
+        rolling = StrengthMomentum.calc_rolling_risk(self.prices, self.expected, 0.05)
+        np.testing.assert_array_equal(rolling_risk_by_row(self.prices, self.expected, 0.05), rolling.values)
+        self.assertTrue(rolling.index.equals(self.expected.index))
+
+    def test_risk_should_be_capped_and_reset_on_zero_expected_risk(self):
+        index = pd.date_range('2001-01-01', periods=5)
+        prices = pd.DataFrame({'EURUSD': [1.0, 1.1, 1.2, 1.3, 1.4]}, index=index)
+        expected = pd.DataFrame({'EURUSD': [0.01, 0.01, 0.01, 0.0, 0.01]}, index=index)
+        rolling = StrengthMomentum.calc_rolling_risk(prices, expected, 0.02)
+        np.testing.assert_allclose([0.01, 0.02, 0.02, 0.0, 0.01], rolling['EURUSD'].values)
+
+
+class SignalStageTests(unittest.TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2001-01-01', periods=4)
+        self.rates = pd.DataFrame({'EURUSD': [1.0, 1.1, 1.21, 1.1], 'USDJPY': [100.0, 90.0, 99.0, 99.0]},
+                                  index=index)
+
+    def test_relative_returns_should_be_against_usd(self):
+        returns = get_relative_returns(self.rates)
+        self.assertEqual(['USDEUR', 'USDJPY'], list(returns.columns))
+        np.testing.assert_allclose([-0.1, -0.1], returns['USDEUR'].values[1:3])
+        np.testing.assert_allclose([-0.1, 0.1, 0.0], returns['USDJPY'].values[1:])
+
+    def test_expected_risk_should_match_calc_expected_prc_pos(self):
+        ranks = pd.DataFrame([[0.0, 1.0, 2.5, 3.0], [4.0, 5.0, 6.0, 7.0]], columns=list('abcd'))
+        expected = calc_expected_prc_pos_df(0.01, 7, ranks)
+        np.testing.assert_array_equal([[calc_expected_prc_pos(0.01, 7, y) for y in row] for row in ranks.values],
+                                      expected.values)
+
+    def test_unnatural_pairs_should_be_inverted(self):
+        risk = pd.DataFrame({'USDEUR': [0.01, -0.02], 'USDJPY': [0.01, -0.02]})
+        natural = convert_to_natural_pair_df(self.rates.columns.values, risk)
+        self.assertEqual(['EURUSD', 'USDJPY'], list(natural.columns))
+        np.testing.assert_array_equal([-0.01, 0.02], natural['EURUSD'].values)
+        np.testing.assert_array_equal([0.01, -0.02], natural['USDJPY'].values)
+
+    def test_run_with_diagnostics_should_give_natural_pair_frames(self):
+        rng = np.random.RandomState(3)
+        index = pd.date_range('2001-01-01', periods=120)
+        closes = pd.DataFrame(1.5 + np.cumsum(rng.normal(size=(120, 3)), axis=0) * 0.01, index=index,
+                              columns=['EURUSD', 'USDJPY', 'GBPUSD'])
+        diagnostic = StrengthMomentum(lookback=5).run_with_diagnostics(PriceCube.from_close(closes))
+        self.assertEqual(list(closes.columns), list(diagnostic.rolling_risk.columns))
+        self.assertTrue(diagnostic.rolling_risk.abs().values.max() > 0)
+        self.assertTrue(len(diagnostic.trade_details) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lab.core.price_cube import PriceCube, as_price_cube
+from lab.core.backtester import Backtester
+from lab.core.sweep import sweep, run_combination, parameter_grid, share_cube, attach_cube, METRICS, \
+    _init_sweep_context, _release_sweep_context, _sweep_context
+from lab.strategy.strategy import Strategy
+import lab.test.helpers as hp
+
+
+class RandomStrategy(Strategy):
+    '''Random instructions, defined at module level so it can be pickled into the workers'''
+
+    def __init__(self, seed, density=0.3):
+        self.seed = seed
+        self.density = density
+
+    def run(self, rates):
+        return hp.random_trade_details(rates, self.seed, self.density)
+
+    def schedule(self, positions, data_ser, context=None):
+        pass
+
+
+class SweepTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = as_price_cube(hp.random_rates(5, bars=150))
+
+    def test_parameter_grid_should_give_every_combination(self):
+        combinations = parameter_grid({'seed': [1, 2], 'commission_per_k': [0.0, 0.5, 1.0]})
+        self.assertEqual(6, len(combinations))
+        self.assertEqual({'seed': 1, 'commission_per_k': 0.5}, combinations[1])
+        self.assertEqual({'seed': 2, 'commission_per_k': 1.0}, combinations[-1])
+
+    def test_shared_cube_should_round_trip(self):
+        closes = pd.DataFrame(np.random.RandomState(1).rand(20, 2), index=pd.date_range('2012-01-01', periods=20),
+                              columns=['EURUSD', 'USDJPY'])
+        cube = PriceCube.from_close(closes)
+        blocks, spec = share_cube(cube)
+        try:
+            # open, high, low and close are one array in a from_close cube
+            self.assertEqual(3, len(blocks))
+            shared, attached = attach_cube(spec)
+            self.assertTrue(shared.index.equals(cube.index))
+            self.assertEqual(list(cube.columns), list(shared.columns))
+            for field in PriceCube.fields:
+                np.testing.assert_array_equal(getattr(cube, field), getattr(shared, field))
+            for block in attached:
+                block.close()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def test_worker_context_should_close_its_blocks_when_released(self):
+        blocks, spec = share_cube(self.rates)
+        try:
+            _init_sweep_context(RandomStrategy, spec, Backtester, 10000, 252)
+            attached = _sweep_context['blocks']
+            _release_sweep_context()
+
+            self.assertEqual({}, _sweep_context)
+            self.assertTrue(all(block.buf is None for block in attached))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def test_sweep_should_match_running_each_combination(self):
+        grid = {'seed': [1, 2, 3], 'commission_per_k': [0.0, 0.5]}
+        table = sweep(RandomStrategy, grid, self.rates, max_workers=2)
+
+        self.assertEqual(['seed', 'commission_per_k'] + list(METRICS), list(table.columns))
+        self.assertEqual(6, len(table))
+        for row, params in zip(table.itertuples(index=False), parameter_grid(grid)):
+            expected = run_combination(RandomStrategy, params, self.rates)
+            self.assertEqual((params['seed'], params['commission_per_k']), (row.seed, row.commission_per_k))
+            for metric in METRICS:
+                np.testing.assert_equal(expected[metric], getattr(row, metric))
+        self.assertTrue((table.trades > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()